@@ -0,0 +1,89 @@
+import logging
+import os
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from clan_rank import Profile, RankResult, cache, ladder
+from members import MembershipIndex
+from metrics import metrics
+
+logger = logging.getLogger('ClanRank')
+
+DEFAULT_CHUNK_SIZE = 32
+
+# Filled in once per worker process by init_worker
+_members = MembershipIndex()
+
+
+def init_worker(cache_directory: str, ranks: dict[str, int], members: MembershipIndex, log_level: int):
+    # Importing clan_rank has already compiled the criteria and loaded QUESTS
+    # in this process, this only copies over what main() configured at runtime
+    global _members
+
+    logging.basicConfig(level=log_level)
+    # A forked worker starts with a copy of the parent's numbers, drop them
+    # so they aren't merged back in twice
+    metrics.drain()
+    cache.directory = cache_directory
+    ladder.set_ranks(ranks)
+    _members = members
+
+
+def score_cached(username: str) -> RankResult | None:
+    # Workers never fetch. Each process would get its own rate limiter and
+    # together they'd blow through the API budgets.
+    rp_response = cache.load("runeprofile", username)
+    wom_response = cache.load("wom", username)
+
+    if rp_response is None or wom_response is None:
+        logger.warning(f"Skipping {username}: no cached RuneProfile and Wise Old Man data")
+        return None
+
+    try:
+        profile = Profile.from_responses(username, rp_response, wom_response, members=_members)
+        profile.set_item_data()
+    except Exception:
+        logger.exception(f"Failed to score {username}")
+        return None
+
+    for change in profile.changes:
+        logger.info(f"{username}: {change}")
+
+    return profile.result()
+
+
+def score_chunk(usernames: list[str]) -> tuple[int, float, list[RankResult | None], dict]:
+    start = time.perf_counter()
+    results = [score_cached(username) for username in usernames]
+
+    # Timings recorded in a worker would die with it, hand them back with the results
+    return os.getpid(), time.perf_counter() - start, results, metrics.drain()
+
+
+def rescore(
+    usernames: list[str],
+    members: MembershipIndex,
+    processes: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[RankResult | None]:
+    # Scores everyone from the cache across a process pool. Results come back
+    # in the same order as usernames, as soon as each chunk is done.
+    chunks = [usernames[i:i + chunk_size] for i in range(0, len(usernames), chunk_size)]
+    ranks = dict(zip(ladder.names, ladder.thresholds))
+    throughput: dict[int, tuple[int, float]] = {}
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=init_worker,
+        initargs=(cache.directory, ranks, members, logging.getLogger().getEffectiveLevel()),
+    ) as pool:
+        for pid, seconds, results, worker_metrics in pool.map(score_chunk, chunks):
+            players, busy = throughput.get(pid, (0, 0.0))
+            throughput[pid] = (players + len(results), busy + seconds)
+            metrics.merge(worker_metrics)
+
+            yield from results
+
+    for pid, (players, busy) in sorted(throughput.items()):
+        rate = players / busy if busy else 0
+        logger.info(f"Worker {pid}: {players} players in {busy:.2f}s ({rate:.0f}/s)")
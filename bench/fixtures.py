@@ -0,0 +1,189 @@
+# Payload corpus for the benchmarks. Three fixed accounts (small, typical and
+# maxed) plus as many synthetic clan members as a run asks for, all shaped
+# like the real RuneProfile/WOM/group responses and generated
+# deterministically, so the same name always gives the same bytes.
+#
+# Recorded payloads can be dropped into a directory laid out like
+#
+#   DIR/group.json
+#   DIR/runeprofile/<username>.json
+#   DIR/wom/<username>.json
+#
+# and take priority over generated ones. `python bench/fixtures.py DIR`
+# writes the generated corpus out in that layout as a starting point.
+import argparse
+import json
+import os
+import random
+import sys
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data.criteria import CRITERIA
+from data.quests import MINIQUESTS, QUESTS
+
+CLAN_GROUP_ID = 1169
+
+# Account name -> how much of the game they've done
+ACCOUNTS = {
+    "Small Fry": 0.1,
+    "Typical Tim": 0.55,
+    "Maxed Max": 1.0,
+}
+
+# Every item a criterion looks for, so completion actually moves the score
+CRITERIA_ITEMS = sorted({item for criterion in CRITERIA for item in criterion.get('items', [])})
+
+DIARY_TASKS = [10, 12, 11, 9]
+COMBAT_ACHIEVEMENT_TASKS = [38, 41, 61, 131, 103, 55]
+COLLECTION_LOG_SLOTS = 1500
+
+
+def member_name(index: int) -> str:
+    return f"Member {index:04d}"
+
+
+def seeded(username: str) -> random.Random:
+    return random.Random(zlib.crc32(username.lower().encode()))
+
+
+def completion(username: str) -> float:
+    return ACCOUNTS.get(username, seeded(username).betavariate(2, 2))
+
+
+def runeprofile(username: str) -> dict:
+    rng = seeded(username)
+    done = completion(username)
+
+    def completed() -> bool:
+        return rng.random() < done
+
+    quests = [
+        {"id": index, "name": name, "type": 1, "state": 2 if completed() else rng.choice([0, 1])}
+        for index, name in enumerate(QUESTS)
+    ]
+    quests += [
+        {"id": 500 + index, "name": name, "type": 2, "state": 2 if completed() else 0}
+        for index, name in enumerate(MINIQUESTS)
+    ]
+
+    items = [
+        {"id": index, "name": name, "quantity": 1}
+        for index, name in enumerate(CRITERIA_ITEMS)
+        if completed()
+    ]
+    items += [
+        {"id": 10000 + slot, "name": f"Item {slot}", "quantity": rng.randint(1, 5)}
+        for slot in range(int(COLLECTION_LOG_SLOTS * done))
+    ]
+
+    return {
+        "username": username,
+        "accountType": "NORMAL",
+        "quests": quests,
+        "achievementDiaryTiers": [
+            {"areaId": area, "tierIndex": tier, "tasksCount": tasks, "completedCount": tasks if completed() else rng.randint(0, tasks)}
+            for area in range(12)
+            for tier, tasks in enumerate(DIARY_TASKS)
+        ],
+        "combatAchievementTiers": [
+            {"id": tier, "tasksCount": tasks, "completedCount": tasks if rng.random() < done * (1.1 - tier * 0.15) else rng.randint(0, tasks)}
+            for tier, tasks in enumerate(COMBAT_ACHIEVEMENT_TASKS, start=1)
+        ],
+        "items": items,
+    }
+
+
+def wom(username: str) -> dict:
+    done = completion(username)
+
+    return {
+        "id": zlib.crc32(username.lower().encode()),
+        "username": username.lower(),
+        "displayName": username,
+        "type": "regular",
+        "ehb": round(done * 1400, 3),
+        "ehp": round(done * 1300, 3),
+        "latestSnapshot": {
+            "createdAt": "2026-10-01T00:00:00.000Z",
+            "data": {"skills": {"overall": {"rank": 1, "level": int(32 + done * 2245), "experience": int(done * 4.6e9)}}},
+        },
+    }
+
+
+def group(members: int) -> dict:
+    usernames = list(ACCOUNTS) + [member_name(index) for index in range(members - len(ACCOUNTS))]
+
+    return {
+        "id": CLAN_GROUP_ID,
+        "name": "Benchmark Clan",
+        "memberCount": len(usernames),
+        "memberships": [
+            {
+                "playerId": wom(username)["id"],
+                "groupId": CLAN_GROUP_ID,
+                "role": "member",
+                "createdAt": f"20{22 + index % 4}-0{1 + index % 9}-01T00:00:00.000Z",
+                "player": {"id": wom(username)["id"], "username": username.lower(), "displayName": username},
+            }
+            for index, username in enumerate(usernames)
+        ],
+    }
+
+
+class Corpus():
+    # Raw response bodies by source and key, recorded ones first
+    def __init__(self, directory: str | None = None, members: int = 1000) -> None:
+        self.directory = directory
+        self.members = members
+        self._bodies: dict[tuple[str, str], bytes] = {}
+
+    def _recorded(self, *parts: str) -> bytes | None:
+        if self.directory is None:
+            return None
+
+        try:
+            with open(os.path.join(self.directory, *parts), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get(self, source: str, key: str) -> bytes:
+        if (source, key) not in self._bodies:
+            if source == "group":
+                body = self._recorded("group.json") or json.dumps(group(self.members)).encode()
+            else:
+                generate = runeprofile if source == "runeprofile" else wom
+                body = self._recorded(source, f"{key}.json") or json.dumps(generate(key)).encode()
+
+            self._bodies[(source, key)] = body
+
+        return self._bodies[(source, key)]
+
+    def usernames(self) -> list[str]:
+        return [member['player']['displayName'] for member in json.loads(self.get("group", str(CLAN_GROUP_ID)))['memberships']]
+
+
+def write(directory: str, members: int):
+    corpus = Corpus(members=members)
+
+    for source in ("runeprofile", "wom"):
+        os.makedirs(os.path.join(directory, source), exist_ok=True)
+
+    with open(os.path.join(directory, "group.json"), 'wb') as f:
+        f.write(corpus.get("group", str(CLAN_GROUP_ID)))
+
+    for username in corpus.usernames():
+        for source in ("runeprofile", "wom"):
+            with open(os.path.join(directory, source, f"{username}.json"), 'wb') as f:
+                f.write(corpus.get(source, username))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the benchmark payload corpus to a directory")
+    parser.add_argument('directory')
+    parser.add_argument('--members', type=int, default=1000)
+    args = parser.parse_args()
+
+    write(args.directory, args.members)
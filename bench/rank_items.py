@@ -0,0 +1,105 @@
+# Compares the pydantic RankItem-per-criterion representation scoring used to
+# build for every player with the ScoreVector used on the hot path now.
+#
+#   python bench/rank_items.py --players 5000
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import clan_rank
+from cache import CachedResponse
+from clan_rank import COMPILED_RULES, CRITERIA, Profile, RankItem, ScoreVector
+from data.quests import QUESTS
+
+
+def synthetic_profile(username: str, rng: random.Random) -> Profile:
+    rp_data = {
+        "quests": [
+            {"name": name, "type": 1, "state": rng.choice([0, 1, 2, 2])}
+            for name in QUESTS
+        ],
+        "achievementDiaryTiers": [
+            {"areaId": area, "tierIndex": tier, "tasksCount": 10, "completedCount": rng.randint(0, 10)}
+            for area in range(12)
+            for tier in range(4)
+        ],
+        "combatAchievementTiers": [
+            {"id": tier, "tasksCount": 40, "completedCount": rng.randint(0, 40)}
+            for tier in range(1, 7)
+        ],
+        "items": [
+            {"id": item_id, "name": f"Item {item_id}", "quantity": 1}
+            for item_id in rng.sample(range(1600), rng.randint(100, 1500))
+        ],
+    }
+    wom_data = {
+        "ehb": rng.uniform(0, 1500),
+        "ehp": rng.uniform(0, 1500),
+        "latestSnapshot": {"data": {"skills": {"overall": {"level": rng.randint(500, 2277)}}}},
+    }
+
+    return Profile.from_responses(
+        username,
+        CachedResponse.from_body(json.dumps(rp_data).encode()),
+        CachedResponse.from_body(json.dumps(wom_data).encode()),
+    )
+
+
+def score_with_rank_items(stats: dict, possible_points: list[int]) -> int:
+    rank_items = [
+        RankItem(name=criterion.name, possible_points=possible)
+        for criterion, possible in zip(CRITERIA, possible_points)
+    ]
+
+    total = 0
+    for (rule, criterion), rank_item in zip(COMPILED_RULES, rank_items):
+        rank_item.points = rule(criterion, stats, rank_item.possible_points)
+        rank_item.completed = rank_item.points == rank_item.possible_points
+        total += rank_item.points
+
+    return total
+
+
+def score_with_vector(stats: dict, possible_points: list[int]) -> int:
+    scores = ScoreVector.empty(list(possible_points))
+    points = scores.points
+
+    total = 0
+    for index, (rule, criterion) in enumerate(COMPILED_RULES):
+        points[index] = rule(criterion, stats, possible_points[index])
+        total += points[index]
+
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RankItem vs ScoreVector benchmark")
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    clan_rank.cache.enabled = False
+    rng = random.Random(1169)
+
+    profiles = [synthetic_profile(f"player {i}", rng) for i in range(args.players)]
+    inputs = [(profile.get_stats(), profile.scores.possible_points) for profile in profiles]
+
+    for stats, possible_points in inputs:
+        assert score_with_rank_items(stats, possible_points) == score_with_vector(stats, possible_points)
+
+    for name, score in [("pydantic RankItem", score_with_rank_items), ("ScoreVector", score_with_vector)]:
+        best = min(timeit.repeat(
+            lambda: [score(stats, possible_points) for stats, possible_points in inputs],
+            number=1,
+            repeat=args.repeat,
+        ))
+        print(f"{name:<20} {best * 1000:8.1f} ms  {best / args.players * 1e6:7.1f} us/player")
+
+
+if __name__ == "__main__":
+    main()
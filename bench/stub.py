@@ -0,0 +1,76 @@
+# Local stand-in for the RuneProfile and Wise Old Man APIs, serving a
+# fixtures.Corpus. Both APIs live under one server:
+#
+#   /runeprofile/profiles/<username>
+#   /wom/v2/players/<username>
+#   /wom/v2/groups/<id>
+#
+# Responses carry an ETag and honour If-None-Match like the real thing.
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from fixtures import Corpus
+
+ROUTES = {
+    "/runeprofile/profiles/": "runeprofile",
+    "/wom/v2/players/": "wom",
+    "/wom/v2/groups/": "group",
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    corpus: Corpus
+    latency: float = 0
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path)
+        route = next((prefix for prefix in ROUTES if path.startswith(prefix)), None)
+
+        if route is None:
+            return self.send(404, b'{"message":"Not found"}')
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        body = self.corpus.get(ROUTES[route], path[len(route):])
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+        if self.headers.get('If-None-Match') == etag:
+            return self.send(304, b'', etag)
+
+        self.send(200, body, etag)
+
+    def send(self, status: int, body: bytes, etag: str | None = None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+
+        if etag:
+            self.send_header('ETag', etag)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer():
+    def __init__(self, corpus: Corpus, latency: float = 0) -> None:
+        handler = type('Handler', (StubHandler,), {"corpus": corpus, "latency": latency})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
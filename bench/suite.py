@@ -0,0 +1,221 @@
+# Times the hot paths end to end over the fixtures corpus and prints the
+# results as JSON, so runs can be diffed or compared against a baseline:
+#
+#   python bench/suite.py --output before.json
+#   ... change something ...
+#   python bench/suite.py --compare before.json
+#
+# --compare exits with status 1 if any case got slower than --tolerance.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import clan_rank
+from batch import rescore
+from cache import CachedResponse, loads
+from clan_rank import Profile, load_members, print_leaderboard, project_runeprofile, rank_clan, score_clan
+from fixtures import ACCOUNTS, CLAN_GROUP_ID, Corpus
+from output import stream_results
+from stub import StubServer
+
+
+def measure(name: str, run, repeat: int, items: int = 1, setup=None) -> dict:
+    kwargs = {"setup": setup} if setup else {}
+    times = timeit.repeat(run, number=1, repeat=repeat, **kwargs)
+    best = min(times)
+
+    print(f"{name:<32} {best * 1000:10.2f} ms  {best / items * 1e6:10.1f} us/item", file=sys.stderr)
+
+    return {
+        "name": name,
+        "items": items,
+        "repeat": repeat,
+        "best_s": best,
+        "median_s": statistics.median(times),
+        "per_item_us": best / items * 1e6,
+    }
+
+
+def profile_cases(corpus: Corpus, repeat: int) -> list[dict]:
+    results = []
+    clan_rank.cache.enabled = False
+
+    for username in ACCOUNTS:
+        rp_body = corpus.get("runeprofile", username)
+        wom_body = corpus.get("wom", username)
+        projected = json.dumps(project_runeprofile(loads(rp_body))).encode()
+
+        def construct() -> Profile:
+            return Profile.from_responses(username, CachedResponse.from_body(projected), CachedResponse.from_body(wom_body))
+
+        profile = construct()
+
+        def score():
+            # The profile keeps its quest stats after the first call, clear
+            # them so every repeat times quest scoring too
+            profile._quest_stats = None
+            profile.init_scores()
+            profile.set_item_data()
+
+        def summary():
+            with contextlib.redirect_stdout(io.StringIO()):
+                profile.print_summary()
+
+        results += [
+            measure(f"parse/{username}", lambda: loads(rp_body), repeat * 20),
+            measure(f"project/{username}", lambda: project_runeprofile(loads(rp_body)), repeat * 20),
+            measure(f"profile/{username}", construct, repeat * 20),
+            measure(f"set_item_data/{username}", score, repeat * 20),
+            measure(f"print_summary/{username}", summary, repeat),
+        ]
+
+    clan_rank.cache.enabled = True
+    return results
+
+
+def render_cases(corpus: Corpus, repeat: int) -> list[dict]:
+    clan_rank.cache.enabled = False
+
+    results = []
+
+    for username in corpus.usernames():
+        profile = Profile.from_responses(
+            username,
+            CachedResponse.from_body(corpus.get("runeprofile", username)),
+            CachedResponse.from_body(corpus.get("wom", username)),
+        )
+        profile.set_item_data()
+        results.append(profile.result())
+
+    results = rank_clan(results)
+    clan_rank.cache.enabled = True
+
+    def table():
+        with contextlib.redirect_stdout(io.StringIO()):
+            print_leaderboard(results)
+
+    return [measure("render/table", table, repeat, len(results))] + [
+        measure(f"render/{output_format}", lambda: stream_results(results, output_format, io.StringIO()), repeat, len(results))
+        for output_format in ("json", "ndjson", "csv")
+    ]
+
+
+def clan_cases(corpus: Corpus, repeat: int, workers: int, latency: float) -> list[dict]:
+    members = len(corpus.usernames())
+    cache_root = tempfile.mkdtemp(prefix="clan-rank-bench-")
+
+    def fresh_cache():
+        clan_rank.cache.directory = tempfile.mkdtemp(dir=cache_root)
+
+    def drop_scores():
+        shutil.rmtree(os.path.join(clan_rank.cache.directory, "score"), ignore_errors=True)
+
+    def rescore_clan():
+        clan = load_members()
+        rank_clan(list(rescore(clan.usernames(), clan)))
+
+    try:
+        with StubServer(corpus, latency) as stub:
+            clan_rank.RUNEPROFILE_URL = f"{stub.url}/runeprofile"
+            clan_rank.WOM_URL = f"{stub.url}/wom/v2"
+
+            return [
+                # Empty cache, everything comes from the stub
+                measure("clan/cold", lambda: score_clan(workers=workers), repeat, members, setup=fresh_cache),
+                # Same cache again, nothing changed so every score is restored
+                measure("clan/warm", lambda: score_clan(workers=workers), repeat, members),
+                # Payloads cached but no stored scores, all CPU
+                measure("clan/rescore", rescore_clan, repeat, members, setup=drop_scores),
+            ]
+    finally:
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+
+def compare(results: list[dict], baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = {case['name']: case for case in json.load(f)['results']}
+
+    ok = True
+
+    for case in results:
+        before = baseline.get(case['name'])
+
+        if before is None:
+            continue
+
+        ratio = case['best_s'] / before['best_s']
+        slower = ratio > tolerance
+        ok = ok and not slower
+
+        print(f"{case['name']:<32} {ratio:6.2f}x{'  SLOWER' if slower else ''}", file=sys.stderr)
+
+    return ok
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(__file__),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ClanRank benchmark suite")
+    parser.add_argument('--fixtures', type=str, default=None, help='Directory of recorded payloads to use instead of generated ones')
+    parser.add_argument('--members', type=int, default=1000, help='Size of the synthetic clan')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=8, help='Fetch threads for the clan cases')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds the stub waits before each response')
+    parser.add_argument('--skip-clan', action='store_true', help='Only run the per-profile cases')
+    parser.add_argument('--output', type=str, default=None, help='Write the JSON results here instead of stdout')
+    parser.add_argument('--compare', type=str, default=None, help='Baseline JSON from an earlier run')
+    parser.add_argument('--tolerance', type=float, default=1.2, help='Slowdown ratio --compare fails on')
+    args = parser.parse_args()
+
+    corpus = Corpus(args.fixtures, args.members)
+
+    results = profile_cases(corpus, args.repeat)
+    results += render_cases(corpus, args.repeat)
+
+    if not args.skip_clan:
+        results += clan_cases(corpus, args.repeat, args.workers, args.latency)
+
+    report = json.dumps({
+        "commit": commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "group_id": CLAN_GROUP_ID,
+        "members": len(corpus.usernames()),
+        "results": results,
+    }, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Checks the NumPy engine in vector.py gives exactly the same points as
+# Profile.set_item_data, then times both over a synthetic clan, from the
+# cached (projected) payload bytes to scored results, loading included.
+#
+#   python bench/vector.py --players 10000
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, UTC
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import clan_rank
+from cache import CachedResponse, dumps
+from clan_rank import Profile, project_runeprofile, project_wom
+from fixtures import group, runeprofile, wom
+from members import MembershipIndex
+from vector import ClanArrays
+
+AS_OF = datetime(2026, 10, 1, tzinfo=UTC)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-player vs vectorised scoring benchmark")
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    clan_rank.cache.enabled = False
+
+    members = MembershipIndex.from_group(group(args.players))
+    bodies = [
+        (username, dumps(project_runeprofile(runeprofile(username))), dumps(project_wom(wom(username))))
+        for username in members.usernames()
+    ]
+
+    def responses():
+        # Fresh every run so both sides pay for parsing the payloads
+        return [
+            (username, CachedResponse.from_body(rp_body), CachedResponse.from_body(wom_body))
+            for username, rp_body, wom_body in bodies
+        ]
+
+    def score_profiles():
+        results = []
+
+        for username, rp_response, wom_response in responses():
+            profile = Profile.from_responses(username, rp_response, wom_response, members=members, as_of=AS_OF)
+            profile.set_item_data()
+            results.append(profile.result())
+
+        return results
+
+    def load_arrays():
+        return ClanArrays.from_responses(responses(), members, AS_OF)
+
+    arrays = load_arrays()
+    expected = score_profiles()
+    results = arrays.results()
+
+    assert [result.scores.points for result in results] == [result.scores.points for result in expected], \
+        "vectorised scores differ from Profile.set_item_data"
+    assert [result.rank for result in results] == [result.rank for result in expected], "vectorised ranks differ"
+
+    for name, run, repeat in [
+        ("Profile.set_item_data", score_profiles, 1),
+        ("ClanArrays load + score", lambda: load_arrays().results(), args.repeat),
+        ("  load only", load_arrays, args.repeat),
+        ("  score only", lambda: arrays.ranks(arrays.totals()), args.repeat),
+    ]:
+        best = min(timeit.repeat(run, number=1, repeat=repeat))
+        print(f"{name:<24} {best * 1000:9.2f} ms  {best / args.players * 1e6:8.2f} us/player")
+
+
+if __name__ == "__main__":
+    main()
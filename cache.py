@@ -0,0 +1,317 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from functools import cached_property
+from typing import Callable
+from urllib.parse import quote
+
+from metrics import metrics
+
+# orjson parses these payloads several times faster than the stdlib and is
+# used whenever it's installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger('ClanRank')
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'clan-rank',
+)
+
+# Seconds each source stays fresh for. Group membership barely changes
+# so it can live a lot longer than player stats. Once an entry goes stale
+# it's revalidated with a conditional request rather than thrown away.
+DEFAULT_TTLS = {
+    "runeprofile": 60 * 60,
+    "wom": 60 * 60,
+    "group": 24 * 60 * 60,
+}
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def loads(body: bytes):
+    return orjson.loads(body) if orjson else json.loads(body)
+
+
+def dumps(data) -> bytes:
+    # Always minified, nothing reads the cache by eye
+    return orjson.dumps(data) if orjson else json.dumps(data, separators=(',', ':')).encode()
+
+
+def normalize_username(username: str) -> str:
+    # OSRS names are case insensitive and treat spaces, underscores and hyphens the same
+    return username.strip().lower().replace('_', ' ').replace('-', ' ')
+
+
+class CachedResponse():
+    # The raw body is kept as bytes and only parsed when something asks for
+    # .data, so an unchanged payload can be compared by digest alone
+    def __init__(self, body: bytes, meta: dict) -> None:
+        self.body = body
+        self.meta = meta
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "CachedResponse":
+        return cls(body, {"fetched_at": time.time(), "digest": hashlib.sha256(body).hexdigest()})
+
+    @property
+    def digest(self) -> str:
+        return self.meta['digest']
+
+    @property
+    def source_digest(self) -> str:
+        # Digest of what upstream actually sent, which differs from .digest
+        # when only a projection of it was stored
+        return self.meta.get('source_digest', self.meta['digest'])
+
+    @property
+    def fetched_at(self) -> float:
+        return self.meta['fetched_at']
+
+    def validators(self) -> dict[str, str]:
+        headers = {}
+
+        if self.meta.get('etag'):
+            headers['If-None-Match'] = self.meta['etag']
+
+        if self.meta.get('last_modified'):
+            headers['If-Modified-Since'] = self.meta['last_modified']
+
+        return headers
+
+    @cached_property
+    def data(self) -> dict:
+        with metrics.timer("parse_seconds"):
+            return loads(self.body)
+
+
+class ResponseCache():
+    def __init__(
+        self,
+        directory: str = DEFAULT_CACHE_DIR,
+        ttls: dict[str, int] | None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        enabled: bool = True,
+        refresh: bool = False,
+        projections: dict[str, Callable[[dict], dict]] | None = None,
+        pinned: set[str] | None = None,
+    ) -> None:
+        self.directory = directory
+        self.ttls = DEFAULT_TTLS | (ttls or {})
+        # source -> function picking out the parts of a payload worth keeping.
+        # Sources without one are stored exactly as they were sent.
+        self.projections = projections or {}
+        # Sources that are state rather than responses and can't be fetched
+        # again, eviction leaves them alone. They still count towards the size.
+        self.pinned = pinned or set()
+        self.max_bytes = max_bytes
+        # enabled=False never touches disk, refresh=True always goes upstream
+        # (conditionally, if there's something cached) but still stores the result
+        self.enabled = enabled
+        self.refresh = refresh
+
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    def path(self, source: str, key: str) -> str:
+        return os.path.join(self.directory, source, quote(normalize_username(key), safe='') + '.json')
+
+    def load(self, source: str, key: str) -> CachedResponse | None:
+        # Returns whatever is on disk regardless of age
+        if not self.enabled:
+            return None
+
+        path = self.path(source, key)
+
+        try:
+            with open(path + '.meta') as f:
+                meta = json.load(f)
+
+            with open(path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable cache entry {path}")
+            return None
+
+        if hashlib.sha256(body).hexdigest() != meta.get('digest'):
+            logger.warning(f"Ignoring corrupt cache entry {path}")
+            return None
+
+        # Bump the mtime so eviction drops the least recently used entries first
+        os.utime(path)
+        return CachedResponse(body, meta)
+
+    def is_fresh(self, source: str, entry: CachedResponse) -> bool:
+        return not self.refresh and time.time() - entry.fetched_at <= self.ttls.get(source, 0)
+
+    def set(self, source: str, key: str, data: dict) -> None:
+        self.store(source, key, dumps(data))
+
+    def store(self, source: str, key: str, body: bytes, headers: dict | None = None) -> CachedResponse:
+        headers = headers or {}
+        source_digest = hashlib.sha256(body).hexdigest()
+        projection = self.projections.get(source)
+
+        if projection is not None:
+            with metrics.timer("project_seconds", source=source):
+                data = projection(loads(body))
+                body = dumps(data)
+
+        meta = {
+            "fetched_at": time.time(),
+            "digest": hashlib.sha256(body).hexdigest(),
+            "source_digest": source_digest,
+            "etag": headers.get('ETag'),
+            "last_modified": headers.get('Last-Modified'),
+        }
+        entry = CachedResponse(body, meta)
+
+        if projection is not None:
+            # Already parsed, don't parse it again on first use
+            entry.data = data
+
+        if not self.enabled:
+            return entry
+
+        path = self.path(source, key)
+        meta_body = json.dumps(meta).encode()
+        # An overwritten entry only grows the cache by the difference
+        replaced = self._entry_size(path)
+        self._write(path, body)
+        self._write(path + '.meta', meta_body)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += len(body) + len(meta_body) - replaced
+
+            if self._size > self.max_bytes:
+                self._evict()
+
+        return entry
+
+    def touch(self, source: str, key: str, entry: CachedResponse) -> CachedResponse:
+        # Upstream confirmed the cached body is current, restart its TTL
+        entry.meta['fetched_at'] = time.time()
+
+        if self.enabled:
+            path = self.path(source, key)
+            meta_body = json.dumps(entry.meta).encode()
+            replaced = self._meta_size(path)
+            self._write(path + '.meta', meta_body)
+
+            with self._lock:
+                if self._size is not None:
+                    self._size += len(meta_body) - replaced
+
+        return entry
+
+    def get_or_fetch(self, source: str, key: str, fetch, use_cache: bool = True) -> CachedResponse | None:
+        entry = self.load(source, key) if use_cache else None
+
+        if entry is not None and self.is_fresh(source, entry):
+            metrics.count("cache_lookups", source=source, result="hit")
+            return entry
+
+        response = fetch(key, entry.validators() if entry else None)
+
+        # Don't cache "not found" so the player shows up as soon as they exist
+        if response is None:
+            metrics.count("cache_lookups", source=source, result="not_found")
+            return None
+
+        metrics.count("fetch_bytes", len(response.content), source=source)
+
+        if response.status_code == 304 and entry is not None:
+            metrics.count("cache_lookups", source=source, result="revalidated")
+            return self.touch(source, key, entry)
+
+        # No validator headers (or the server ignored them), so fall back to
+        # comparing content hashes and keep the existing entry if nothing moved
+        if entry is not None and hashlib.sha256(response.content).hexdigest() == entry.source_digest:
+            entry.meta['etag'] = response.headers.get('ETag')
+            entry.meta['last_modified'] = response.headers.get('Last-Modified')
+            metrics.count("cache_lookups", source=source, result="revalidated")
+            return self.touch(source, key, entry)
+
+        metrics.count("cache_lookups", source=source, result="miss")
+        return self.store(source, key, response.content, response.headers)
+
+    def _write(self, path: str, body: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file next to the target and rename over it, so a crash
+        # or a concurrent reader never sees a half written entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.meta'):
+                    continue
+
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size + self._meta_size(path), path))
+
+        return entries
+
+    def _meta_size(self, path: str) -> int:
+        try:
+            return os.stat(path + '.meta').st_size
+        except FileNotFoundError:
+            return 0
+
+    def _entry_size(self, path: str) -> int:
+        # Body and .meta sidecar together, 0 if there's no entry
+        try:
+            return os.stat(path).st_size + self._meta_size(path)
+        except FileNotFoundError:
+            return 0
+
+    def _disk_usage(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+
+        # Trim down to 90% so we aren't evicting again on the very next write
+        for _, size, path in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+
+            if os.path.relpath(path, self.directory).split(os.sep)[0] in self.pinned:
+                continue
+
+            for stale in (path, path + '.meta'):
+                try:
+                    os.unlink(stale)
+                except FileNotFoundError:
+                    pass
+
+            self._size -= size
@@ -1,18 +1,112 @@
-import requests
+if __name__ == "__main__":
+    # Run as a script, hand straight over to the importable module before
+    # anything below runs. Otherwise this file's body runs twice, once as
+    # __main__ and once as clan_rank for the modules imported lazily
+    # (batch, replay, output, server, ...), each with its own fetcher,
+    # cache and ladder. Installed, the clan-rank command calls main directly.
+    import clan_rank
+
+    clan_rank.main()
+    raise SystemExit
+
 from enum import Enum
-from data.quests import QUESTS
-import os
-import json
+from data.quests import QUESTS, MINIQUESTS, QUEST_ALIASES
+from data.criteria import CRITERIA as CRITERIA_TABLE
 import logging
 from datetime import datetime, UTC
-from pydantic import BaseModel
-from tabulate import tabulate
 import argparse
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote, urlsplit
+from fetch import Fetcher
+from members import MembershipIndex
+from metrics import metrics
+from cache import CachedResponse, ResponseCache, DEFAULT_CACHE_DIR, dumps
+import hashlib
+import importlib.util
+import json
+import sys
+import time
+import re
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from models import RankItem
+
+CLAN_GROUP_ID = 1169
+RUNEPROFILE_URL = "https://api.runeprofile.com"
+WOM_URL = "https://api.wiseoldman.net/v2"
+
+# Requests per minute. WOM allows 20/min without an API key, RuneProfile
+# doesn't publish a limit so keep it polite.
+WOM_RATE_LIMIT = 20
+RUNEPROFILE_RATE_LIMIT = 60
+
+fetcher = Fetcher(rate_limits={
+    urlsplit(WOM_URL).netloc: WOM_RATE_LIMIT,
+    urlsplit(RUNEPROFILE_URL).netloc: RUNEPROFILE_RATE_LIMIT,
+})
+logger = logging.getLogger('ClanRank')
 
-MAX_CLOGS = 1594
+RANKS = {
+    "Helper": 0,
+    "Sapphire": 500,
+    "Emerald": 1000,
+    "Ruby": 2000,
+    "Diamond": 3500,
+    "Dragonstone": 5000,
+    "Onyx": 6500,
+    "Zenyte": 8250,
+    "Beast": 10000,
+    "Wrath": 12500,
+}
 
-logger = logging.getLogger('ClanRank')
-logging.basicConfig(level=logging.DEBUG)
+
+class RankLadder():
+    # Rank names and the points they start at, sorted by points so a player's
+    # rank is one bisect instead of a walk over every rank
+    def __init__(self, ranks: dict[str, int]) -> None:
+        self.set_ranks(ranks)
+
+    def set_ranks(self, ranks: dict[str, int]):
+        if not ranks:
+            raise ValueError("The rank ladder needs at least one rank")
+
+        ordered = sorted(ranks.items(), key=lambda rank: rank[1])
+
+        self.names = tuple(name for name, _ in ordered)
+        self.thresholds = tuple(points for _, points in ordered)
+        self.positions = {name: position for position, name in enumerate(self.names)}
+
+    def position(self, points: int) -> int:
+        # Anything below the first threshold still gets the lowest rank
+        return max(bisect_right(self.thresholds, points) - 1, 0)
+
+    def standing(self, points: int) -> tuple[str, str | None, int | None]:
+        # (rank, next rank, points to go). The top rank has nothing after it.
+        position = self.position(points)
+
+        if position + 1 == len(self.names):
+            return self.names[position], None, None
+
+        return self.names[position], self.names[position + 1], self.thresholds[position + 1] - points
+
+
+def clan_percentile(points: int, clan_points: list[int]) -> float:
+    # Share of the clan on the same or fewer points. clan_points must be sorted ascending.
+    if not clan_points:
+        return 100.0
+
+    return 100 * bisect_right(clan_points, points) / len(clan_points)
+
+
+ladder = RankLadder(RANKS)
+
+# RuneProfile quest state
+QUEST_COMPLETED = 2
 
 class DiaryEnum(Enum):
     EASY = 0
@@ -20,447 +114,573 @@ class DiaryEnum(Enum):
     HARD = 2
     ELITE = 3
 
-class RankItem(BaseModel):
-    name: str
-    possible_points: int
-    points: int = 0
-    completed: bool = False
 
-    def to_list(self):
-        return [
-            self.name,
-            "✅" if self.completed else "❌",
-            self.points,
-            self.possible_points
-        ]
-    
-    def complete(self):
-        self.completed = True
-        self.points = self.possible_points
+def __getattr__(name: str):
+    # RankItem lives in models.py so pydantic is only imported when something
+    # actually displays or serialises results
+    if name == "RankItem":
+        from models import RankItem
+        return RankItem
 
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-class Profile():
-    def __init__(self, username: str, use_cache: bool = True) -> None:
-        self.username = username
-        self.join_date = datetime.today().replace(tzinfo=UTC)
-        self.load_data(use_cache=use_cache)
 
-        # Initialise all the data
-        self.quest_points = RankItem(
-            name="Quest Points",
-            possible_points=sum(QUESTS.values()),
-        )
-        self.miniquests = RankItem(
-            name="Miniquests Completed",
-            possible_points=len([
-                quest
-                for quest in self.rp_data['quests']
-                if quest['type'] == 2 # Miniquest
-            ])
-        )
-        self.rfd = RankItem(
-            name="Recipe for Disaster",
-            possible_points=50,
-        )
+class PlayerNotFound(LookupError):
+    # RuneProfile or Wise Old Man has no profile for the name, the only
+    # failure that's the caller's doing rather than ours or upstream's
+    pass
 
-        self.monkey_madness_2 = RankItem(
-            name="Monkey Madness II",
-            possible_points=50,
-        )
 
-        self.dragon_slayer_2 = RankItem(
-            name="Dragon Slayer II",
-            possible_points=100,
-        )
+def fetch_runeprofile(username: str, headers: dict | None = None):
+    # Quoted whole, a name must never reach some other endpoint
+    response = fetcher.get(f"{RUNEPROFILE_URL}/profiles/{quote(username, safe='')}", headers=headers)
 
-        self.song_of_the_elves = RankItem(
-            name="Song of the Elves",
-            possible_points=50,
-        )
+    if response.status_code == 404:
+        logger.warning(f"RuneProfile data not found for {username}")
+        return None
 
-        self.a_kingdom_divided = RankItem(
-            name="A Kingdom Divided",
-            possible_points=50,
-        )
+    # Anything else that isn't a success is an error body, not profile data
+    response.raise_for_status()
+    return response
 
-        self.desert_treasure_2 = RankItem(
-            name="Desert Treasure II",
-            possible_points=100,
-        )
 
-        self.while_guthix_sleeps = RankItem(
-            name="While Guthix Sleeps",
-            possible_points=50,
-        )
+def fetch_wom(username: str, headers: dict | None = None):
+    response = fetcher.get(f"{WOM_URL}/players/{quote(username, safe='')}", headers=headers)
 
-        # Diaries
-        self.achievements_completed = RankItem(
-            name="Achievement Diaries Completed",
-            possible_points=sum([
-                tier['tasksCount']
-                for tier in self.rp_data['achievementDiaryTiers']
-            ])
-        )
+    if response.status_code == 404:
+        logger.warning(f"Wise Old Man data not found for {username}")
+        return None
 
-        self.easy_diaries = RankItem(
-            name="Easy Diaries",
-            possible_points=50,
-        )
+    response.raise_for_status()
+    return response
 
-        self.medium_diaries = RankItem(
-            name="Medium Diaries",
-            possible_points=50,
-        )
 
-        self.hard_diaries = RankItem(
-            name="Hard Diaries",
-            possible_points=100,
-        )
+def project_runeprofile(data: dict) -> dict:
+    # Only the fields scoring reads. Everything else in a profile (skills,
+    # collection log pages, KC, ...) is dropped before it's cached.
+    return {
+        "quests": [
+            {"name": quest['name'], "state": quest['state']}
+            for quest in data['quests']
+        ],
+        "achievementDiaryTiers": [
+            {"tierIndex": tier['tierIndex'], "completedCount": tier['completedCount'], "tasksCount": tier['tasksCount']}
+            for tier in data['achievementDiaryTiers']
+        ],
+        "combatAchievementTiers": [
+            {"id": tier['id'], "completedCount": tier['completedCount'], "tasksCount": tier['tasksCount']}
+            for tier in data['combatAchievementTiers']
+        ],
+        "items": [
+            {field: item[field] for field in ("id", "name") if field in item}
+            for item in data['items']
+        ],
+    }
 
-        self.elite_diaries = RankItem(
-            name="Elite Diaries",
-            possible_points=200,
-        )
 
-        # PvM
-        self.combat_achievement_points = RankItem(
-            name="Combat Achievement Points",
-            possible_points=sum([
-                tier['id'] * tier['tasksCount']
-                for tier in self.rp_data['combatAchievementTiers']
-            ])
-        )
+def project_wom(data: dict) -> dict:
+    snapshot = data.get('latestSnapshot')
 
-        self.easy_combat_achievements = RankItem(
-            name="Easy Combat Achievements",
-            possible_points=50,
-        )
+    return {
+        # The id stays the same when a player renames, unlike their name
+        "id": data.get('id'),
+        "displayName": data.get('displayName'),
+        # Only moves when their stats do, the refresh scheduler's activity signal
+        "lastChangedAt": data.get('lastChangedAt'),
+        "ehb": data['ehb'],
+        "ehp": data['ehp'],
+        "latestSnapshot": snapshot and {
+            "data": {"skills": {"overall": {"level": snapshot['data']['skills']['overall']['level']}}},
+        },
+    }
 
-        self.medium_combat_achievements = RankItem(
-            name="Medium Combat Achievements",
-            possible_points=50,
-        )
 
-        self.hard_combat_achievements = RankItem(
-            name="Hard Combat Achievements",
-            possible_points=100,
-        )   
+cache = ResponseCache(projections={
+    "runeprofile": project_runeprofile,
+    "wom": project_wom,
+}, pinned={"schedule"})
 
-        self.elite_combat_achievements = RankItem(
-            name="Elite Combat Achievements",
-            possible_points=100,
-        )
 
-        self.master_combat_achievements = RankItem(
-            name="Master Combat Achievements",
-            possible_points=200,
-        )
+def fetch_clan(group_id: int | str = CLAN_GROUP_ID, headers: dict | None = None):
+    response = fetcher.get(f"{WOM_URL}/groups/{group_id}", headers=headers)
+    response.raise_for_status()
+    return response
 
-        self.grandmaster_combat_achievements = RankItem(
-            name="Grandmaster Combat Achievements",
-            possible_points=300,
-        )
 
-        self.dragon_defender = RankItem(
-            name="Dragon Defender",
-            possible_points=50,
-        )
+def load_members(use_cache: bool = True) -> MembershipIndex:
+    # The group is refetched on its own TTL, and only parsed again when it has
+    # actually changed since the index was last built
+    group = cache.get_or_fetch("group", str(CLAN_GROUP_ID), fetch_clan, use_cache=use_cache)
+    return index_members(group, use_cache)
 
-        self.fighter_torso = RankItem(
-            name="Fighter Torso",
-            possible_points=50,
-        )   
 
-        self.fire_cape = RankItem(
-            name="Fire Cape",
-            possible_points=100,
-        )
+def load_cached_members() -> MembershipIndex:
+    # Whatever group is cached, however old, for runs that must never go upstream
+    group = cache.load("group", str(CLAN_GROUP_ID))
 
-        self.imbued_god_cape = RankItem(
-            name="Imbued God Cape",
-            possible_points=50,
-        )
+    if group is None:
+        raise LookupError(f"WOM group {CLAN_GROUP_ID} isn't cached, run --clan first")
 
-        self.vorkaths_head = RankItem(
-            name="Vorkath's Head",
-            possible_points=50,
-        )
+    return index_members(group)
 
-        self.gauntlet_cape = RankItem(
-            name="Gauntlet Cape",
-            possible_points=50,
-        )
 
-        self.thread_of_elidinis = RankItem(
-            name="Thread of Elidinis",
-            possible_points=50,
-        )
+def index_members(group: CachedResponse, use_cache: bool = True) -> MembershipIndex:
+    stored = cache.load("members", str(CLAN_GROUP_ID)) if use_cache else None
 
-        self.masori_crafting_kit = RankItem(
-            name="Masori Crafting Kit",
-            possible_points=25,
-        )
+    if stored is not None and stored.data['group'] == group.digest:
+        return MembershipIndex.from_dict(stored.data)
 
-        self.menaphite_ornament_kit = RankItem(
-            name="Menaphite Ornament Kit",
-            possible_points=25,
-        )
+    members = MembershipIndex.from_group(group.data)
+    cache.set("members", str(CLAN_GROUP_ID), members.to_dict() | {"group": group.digest})
 
-        self.cursed_phalanx = RankItem(
-            name="Cursed Phalanx",
-            possible_points=50,
-        )
+    return members
 
-        self.toa_remnants = RankItem(
-            name="ToA Remnants",
-            possible_points=200,
-        )
 
-        self.xerics_guard = RankItem(
-            name="Xeric's Guard",
-            possible_points=200,
-        )
+# Shared, immutable metadata for one criterion. A player's results live in
+# a ScoreVector indexed the same way as CRITERIA, not on these.
+@dataclass(frozen=True, slots=True)
+class Criterion():
+    key: str
+    category: str
+    name: str
+    rule: str
+    points: int | None = None
+    stat: str | None = None
+    value: int = 0
+    tier: int = 0
+    quest: str | None = None
+    items: frozenset[str] = frozenset()
+    item_ids: frozenset[int] = frozenset()
+    # Which part of the inputs this criterion reads, so a rescore only
+    # re-evaluates criteria whose inputs actually changed
+    section: str | None = None
+
+
+class ItemIndex():
+    # Built once per profile so every item rule is a set lookup instead of
+    # a scan through a collection log that can be well over 1,000 entries
+    def __init__(self, items: list[dict]) -> None:
+        self.names = frozenset(item['name'] for item in items)
+        self.ids = frozenset(item['id'] for item in items if 'id' in item)
+
+    def has_all(self, names: frozenset[str] = frozenset(), ids: frozenset[int] = frozenset()) -> bool:
+        return names <= self.names and ids <= self.ids
+
+
+@lru_cache(maxsize=4096)
+def quest_key(name: str) -> str:
+    # RuneProfile and our own tables don't always agree on punctuation,
+    # so quests are matched on a normalised key
+    name = name.lower().replace('&', 'and').replace('\u2019', "'")
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", re.sub(r"['.]", "", name)).split())
+
+
+@dataclass(frozen=True, slots=True)
+class Quest():
+    key: str
+    name: str
+    points: int
+    miniquest: bool
+    # Keys of the criteria that score this quest on its own
+    criteria: tuple[str, ...] = ()
 
-        self.sinhaza_shroud = RankItem(
-            name="Sinhaza Shroud",
-            possible_points=200,
-        )
 
-        self.icthlarins_shroud = RankItem(
-            name="Icthlarin's Shroud",
-            possible_points=200,
-        )   
+def compile_quests(criteria_table: list[dict]) -> dict[str, Quest]:
+    entries = {}
 
-        self.infernal_cape = RankItem(
-            name="Infernal Cape",
-            possible_points=200,
-        )
+    for name, points, miniquest in [
+        *((name, points, False) for name, points in QUESTS.items()),
+        *((name, 0, True) for name in MINIQUESTS),
+    ]:
+        key = quest_key(name)
 
-        self.dizanas_quiver = RankItem(
-            name="Dizana's Quiver",
-            possible_points=200,
-        )
+        if key in entries:
+            raise ValueError(f"Quests {entries[key][0]!r} and {name!r} normalise to the same name")
 
-        self.ancient_blood_ornament_kit = RankItem(
-            name="Ancient Blood Ornament Kit",
-            possible_points=300,
-        )
+        entries[key] = (name, points, miniquest)
 
-        self.purifying_sigil = RankItem(
-            name="Purifying Sigil",
-            possible_points=300,
-        )
+    aliases = {quest_key(alias): quest_key(name) for alias, name in QUEST_ALIASES.items()}
 
-        self.ehb = RankItem(
-            name="EHB",
-            possible_points=1250,
-        )
+    for alias, key in aliases.items():
+        if key not in entries:
+            raise ValueError(f"Quest alias {alias!r} points at unknown quest {key!r}")
 
-        # Skilling
-        self.level_1250 = RankItem(
-            name="1250 Total Level",
-            possible_points=100,
-        )
+    tags = {}
 
-        self.level_1500 = RankItem(
-            name="1500 Total Level",
-            possible_points=100,
-        )   
+    for entry in criteria_table:
+        if entry['rule'] == "quest":
+            key = aliases.get(quest_key(entry['quest']), quest_key(entry['quest']))
 
-        self.level_1750 = RankItem(
-            name="1750 Total Level",
-            possible_points=100,
-        )
+            if key not in entries:
+                raise ValueError(f"Criterion {entry['key']!r} needs unknown quest {entry['quest']!r}")
 
-        self.level_2000 = RankItem(
-            name="2000 Total Level",
-            possible_points=200,
-        )
+            tags.setdefault(key, []).append(entry['key'])
 
-        self.level_2100 = RankItem(
-            name="2100 Total Level",
-            possible_points=200,
-        )
+    table = {
+        key: Quest(key, name, points, miniquest, tuple(tags.get(key, ())))
+        for key, (name, points, miniquest) in entries.items()
+    }
 
-        self.level_2200 = RankItem(
-            name="2200 Total Level",
-            possible_points=250,
-        )
+    for alias, key in aliases.items():
+        table[alias] = table[key]
 
-        self.level_2277 = RankItem(
-            name="2277 Total Level",
-            possible_points=300,
-        )
+    return table
 
-        self.ehp = RankItem(
-            name="EHP",
-            possible_points=1250,
-        )
 
-        # Miscellaneous
-        self.clogs = RankItem(
-            name="Collections Logged",
-            possible_points=MAX_CLOGS,
-        )
+# Normalised quest name (and alias) -> Quest
+QUEST_TABLE = compile_quests(CRITERIA_TABLE)
+MAX_QUEST_POINTS = sum(QUESTS.values())
+MAX_MINIQUESTS = len(MINIQUESTS)
 
-        self.music_cape = RankItem(
-            name="Music Cape",
-            possible_points=50,
-        )
+unknown_quests: set[str] = set()
 
-        self.one_month_in_clan = RankItem(
-            name="1 Month in Clan",
-            possible_points=30,
-        )
 
-        self.three_months_in_clan = RankItem(
-            name="3 Months in Clan",
-            possible_points=90,
-        )
+def report_unknown_quest(name: str):
+    metrics.count("unknown_quests")
 
-        self.six_months_in_clan = RankItem(
-            name="6 Months in Clan",
-            possible_points=180,
-        )
+    if name not in unknown_quests:
+        unknown_quests.add(name)
+        logger.warning(f"Quest {name!r} isn't in data/quests.py, it won't score anything until it's added")
+
+
+def quest_rule(criterion: Criterion, stats: dict, possible_points: int) -> int:
+    return possible_points if stats['quests'].get(criterion.quest) == QUEST_COMPLETED else 0
+
+
+def item_rule(criterion: Criterion, stats: dict, possible_points: int) -> int:
+    return possible_points if stats['items'].has_all(criterion.items, criterion.item_ids) else 0
+
+
+def tier_rule(criterion: Criterion, stats: dict, possible_points: int) -> int:
+    return possible_points if stats[criterion.stat][criterion.tier] else 0
+
+
+def threshold_rule(criterion: Criterion, stats: dict, possible_points: int) -> int:
+    return possible_points if stats[criterion.stat] >= criterion.value else 0
+
+
+def capped_rule(criterion: Criterion, stats: dict, possible_points: int) -> int:
+    return min(int(stats[criterion.stat]), possible_points)
 
-        self.one_year_in_clan = RankItem(
-            name="1 Year in Clan",
-            possible_points=360,
-        )
 
-        self.two_years_in_clan = RankItem(
-            name="2 Years in Clan",
-            possible_points=720,
+def manual_rule(criterion: Criterion, stats: dict, possible_points: int) -> int:
+    return 0
+
+
+RULES = {
+    "quest": quest_rule,
+    "item": item_rule,
+    "tier": tier_rule,
+    "threshold": threshold_rule,
+    "capped": capped_rule,
+    "manual": manual_rule,
+}
+
+
+# Input sections, and the stats built from each of them
+SECTIONS = {
+    "quests": ["quests", "quest_points", "miniquests"],
+    "diaries": ["diary_tasks", "diary_tiers"],
+    "combat_achievements": ["combat_achievement_points", "combat_achievement_tiers"],
+    "items": ["items", "clogs"],
+    "wom": ["ehb", "ehp", "total_level"],
+    "tenure": ["days_in_clan"],
+}
+STAT_SECTIONS = {
+    stat: section
+    for section, stats in SECTIONS.items()
+    for stat in stats
+}
+RULE_SECTIONS = {
+    "quest": "quests",
+    "item": "items",
+    "manual": None,
+}
+
+
+def compile_criteria(table: list[dict]) -> list[Criterion]:
+    criteria = []
+
+    for entry in table:
+        if entry['rule'] not in RULES:
+            raise ValueError(f"Unknown rule {entry['rule']!r} for criterion {entry['key']!r}")
+
+        if entry['rule'] in RULE_SECTIONS:
+            section = RULE_SECTIONS[entry['rule']]
+        elif entry.get('stat') in STAT_SECTIONS:
+            section = STAT_SECTIONS[entry['stat']]
+        else:
+            raise ValueError(f"Unknown stat {entry.get('stat')!r} for criterion {entry['key']!r}")
+
+        criteria.append(Criterion(**(entry | {
+            "quest": QUEST_TABLE[quest_key(entry['quest'])].key if entry['rule'] == "quest" else None,
+            "items": frozenset(entry.get('items', ())),
+            "item_ids": frozenset(entry.get('item_ids', ())),
+            "section": section,
+        })))
+
+    return criteria
+
+
+CRITERIA = compile_criteria(CRITERIA_TABLE)
+# Rule functions resolved up front so scoring doesn't look them up per criterion
+COMPILED_RULES = [(RULES[criterion.rule], criterion) for criterion in CRITERIA]
+# Changes whenever the points table or the quest list it's scored against
+# does (quest points, miniquests, aliases), so stored scores go stale with it
+CRITERIA_DIGEST = hashlib.sha256(json.dumps({
+    "criteria": CRITERIA_TABLE,
+    "quests": {
+        key: [quest.key, quest.name, quest.points, quest.miniquest, list(quest.criteria)]
+        for key, quest in QUEST_TABLE.items()
+    },
+    "quest_points": MAX_QUEST_POINTS,
+    "miniquests": MAX_MINIQUESTS,
+}, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass(slots=True)
+class ScoreChange():
+    key: str
+    name: str
+    delta: int
+
+    def __str__(self) -> str:
+        return f"{self.delta:+} {self.name}"
+
+
+@dataclass(slots=True)
+class ScoreVector():
+    # Struct of arrays, one slot per entry in CRITERIA
+    possible_points: list[int]
+    points: list[int]
+
+    @classmethod
+    def empty(cls, possible_points: list[int]) -> "ScoreVector":
+        return cls(possible_points, [0] * len(possible_points))
+
+    @property
+    def total(self) -> int:
+        return sum(self.points)
+
+    def completed(self, index: int) -> bool:
+        return self.points[index] == self.possible_points[index]
+
+    def rank_item(self, index: int) -> "RankItem":
+        from models import RankItem
+
+        return RankItem(
+            name=CRITERIA[index].name,
+            possible_points=self.possible_points[index],
+            points=self.points[index],
+            completed=self.completed(index),
         )
 
+
+class Profile():
+    def __init__(
+        self,
+        username: str,
+        use_cache: bool = True,
+        members: MembershipIndex | None = None,
+        responses: tuple[CachedResponse, CachedResponse] | None = None,
+        join_date: datetime | None = None,
+        as_of: datetime | None = None,
+    ) -> None:
+        self.username = username
+        # Scoring as of some other time (replays) instead of now
+        self.as_of = as_of
+        self.join_date = join_date or self.now()
+        # Non-members fall back to joining now, which gives them no tenure
+        self.known_join_date = join_date is not None
+
+        if responses is None:
+            with metrics.timer("load_seconds"):
+                members = self.load_data(use_cache=use_cache, members=members)
+        else:
+            self.rp_response, self.wom_response = responses
+
+        if join_date is None and members is not None:
+            self.find_join_date(members)
+
         # Clan points and rank
         self.clan_points = 0
-        self.rank = "Helper"
+        self.rank, self.next_rank, self.points_to_next_rank = ladder.standing(0)
+        self.changes: list[ScoreChange] = []
+        # Read by both the stats and the saved state, so worked out once
+        self._quest_stats: dict | None = None
+        # What each tier needs, for the what-if simulator
+        self.tier_requirements: dict[str, list[int]] | None = None
+
+        # If none of the payloads changed since the last run the previous
+        # score still stands and we don't even need to parse them
+        self.restored = self.restore_score()
+
+        if not self.restored:
+            self.init_scores()
+
+    @classmethod
+    def from_responses(
+        cls,
+        username: str,
+        rp_response: CachedResponse,
+        wom_response: CachedResponse,
+        join_date: datetime | None = None,
+        members: MembershipIndex | None = None,
+        as_of: datetime | None = None,
+    ) -> "Profile":
+        # Score payloads we already have (fixtures, archives, other processes)
+        # without going anywhere near the network
+        return cls(username, members=members, responses=(rp_response, wom_response), join_date=join_date, as_of=as_of)
+
+    def now(self) -> datetime:
+        return self.as_of or datetime.today().replace(tzinfo=UTC)
+
+    @property
+    def rp_data(self) -> dict | None:
+        return self.rp_response.data if self.rp_response else None
+
+    @property
+    def wom_data(self) -> dict | None:
+        return self.wom_response.data if self.wom_response else None
+
+    def init_scores(self):
+        max_stats = self.get_max_stats()
+
+        self.scores = ScoreVector.empty([
+            criterion.points if criterion.points is not None else max_stats[criterion.stat]
+            for criterion in CRITERIA
+        ])
+
+    def rank_items(self) -> dict[str, "RankItem"]:
+        # Only built when something wants to display or serialise the results
+        return self.result().rank_items()
+
+    def result(self) -> "RankResult":
+        return RankResult(
+            username=self.username,
+            clan_points=self.clan_points,
+            rank=self.rank,
+            next_rank=self.next_rank,
+            points_to_next_rank=self.points_to_next_rank,
+            scores=self.scores,
+            changes=self.changes,
+            player_id=self.wom_data.get('id') if self.wom_data else None,
+            tier_requirements=self.tier_requirements,
+        )
 
 
     def print_summary(self):
+        from tabulate import tabulate
+
         print(f"Username: {self.username}")
         print(f"Rank: {self.rank} ({self.clan_points} pts)")
-        print(f"Next Rank: {self.next_rank} ({self.points_to_next_rank} pts to go)")
+        if self.next_rank is None:
+            print("Next Rank: none, this is the top rank")
+        else:
+            print(f"Next Rank: {self.next_rank} ({self.points_to_next_rank} pts to go)")
         print()
 
         display_data = [["Criteria", "Completion", "Points Eearned", "Possible Points"]]
+        rank_items = self.rank_items()
+        category = None
+
+        for criterion in CRITERIA:
+            if criterion.category != category:
+                if category is not None:
+                    display_data.append([])
+
+                category = criterion.category
+                display_data.append([category])
 
-        display_data.append(["Quests"])
-        display_data.append(self.quest_points.to_list())
-        display_data.append(self.miniquests.to_list())
-        display_data.append(self.rfd.to_list())
-        display_data.append(self.monkey_madness_2.to_list())
-        display_data.append(self.dragon_slayer_2.to_list())
-        display_data.append(self.song_of_the_elves.to_list())
-        display_data.append(self.a_kingdom_divided.to_list())
-        display_data.append(self.desert_treasure_2.to_list())
-        display_data.append(self.while_guthix_sleeps.to_list())
-        display_data.append([])
-
-        display_data.append(["Diaries"])
-        display_data.append(self.achievements_completed.to_list())
-        display_data.append(self.easy_diaries.to_list())
-        display_data.append(self.medium_diaries.to_list())
-        display_data.append(self.hard_diaries.to_list())
-        display_data.append(self.elite_diaries.to_list())
-        display_data.append([])
-
-        display_data.append(["PvM"])
-        display_data.append(self.combat_achievement_points.to_list())
-        display_data.append(self.easy_combat_achievements.to_list())
-        display_data.append(self.medium_combat_achievements.to_list())
-        display_data.append(self.hard_combat_achievements.to_list())
-        display_data.append(self.elite_combat_achievements.to_list())
-        display_data.append(self.master_combat_achievements.to_list())
-        display_data.append(self.grandmaster_combat_achievements.to_list())
-        display_data.append(self.dragon_defender.to_list())
-        display_data.append(self.fighter_torso.to_list())
-        display_data.append(self.fire_cape.to_list())
-        display_data.append(self.imbued_god_cape.to_list())
-        display_data.append(self.vorkaths_head.to_list())
-        display_data.append(self.gauntlet_cape.to_list())
-        display_data.append(self.thread_of_elidinis.to_list())
-        display_data.append(self.masori_crafting_kit.to_list())
-        display_data.append(self.menaphite_ornament_kit.to_list())
-        display_data.append(self.cursed_phalanx.to_list())
-        display_data.append(self.toa_remnants.to_list())
-        display_data.append(self.xerics_guard.to_list())
-        display_data.append(self.sinhaza_shroud.to_list())
-        display_data.append(self.icthlarins_shroud.to_list())
-        display_data.append(self.infernal_cape.to_list())
-        display_data.append(self.dizanas_quiver.to_list())
-        display_data.append(self.ancient_blood_ornament_kit.to_list())
-        display_data.append(self.purifying_sigil.to_list())
-        display_data.append(self.ehb.to_list())
-        display_data.append([])
-
-        display_data.append(["Skilling"])
-        display_data.append(self.level_1250.to_list())
-        display_data.append(self.level_1500.to_list())
-        display_data.append(self.level_1750.to_list())
-        display_data.append(self.level_2000.to_list())
-        display_data.append(self.level_2100.to_list())
-        display_data.append(self.level_2200.to_list())
-        display_data.append(self.level_2277.to_list())
-        display_data.append(self.ehp.to_list())
-        display_data.append([])
-
-        display_data.append(["Miscellaneous"])
-        display_data.append(self.clogs.to_list())
-        display_data.append(self.music_cape.to_list())
-        display_data.append(self.one_month_in_clan.to_list())
-        display_data.append(self.three_months_in_clan.to_list())
-        display_data.append(self.six_months_in_clan.to_list())
-        display_data.append(self.one_year_in_clan.to_list())
-        display_data.append(self.two_years_in_clan.to_list())
+            display_data.append(rank_items[criterion.key].to_list())
 
         print(tabulate(display_data, headers='firstrow'))
 
+        if self.changes:
+            print()
+            print("Changes since last run:")
 
-    def load_data(self, use_cache: bool = True):
-        if use_cache and os.path.exists('/tmp/rp.json'):
-            with open('/tmp/rp.json') as f:
-                self.rp_data = json.load(f)
-        else:
-            rp_data = requests.get(f'https://api.runeprofile.com/profiles/{self.username}').json()
+            for change in self.changes:
+                print(f"  {change}")
 
-            if rp_data.get('message') == "Account not found.":
-                logger.warning("RuneProfile data not found")
-                self.rp_data = None
-            else:
-                self.rp_data = rp_data
-                with open('/tmp/rp.json', 'w') as f:
-                    json.dump(rp_data, f, indent=2)
-        
-        if use_cache and os.path.exists('/tmp/wom.json'):
-            with open('/tmp/wom.json') as f:
-                self.wom_data = json.load(f)
-        else:
-            wom_data = requests.get(f"https://api.wiseoldman.net/v2/players/{self.username}").json()
 
-            if wom_data.get('message') == "Player not found.":
-                logger.warning("Wise Old Man data not found")
-                self.wom_data = None
-            else:
-                self.wom_data = wom_data
-                with open('/tmp/wom.json', 'w') as f:
-                    json.dump(wom_data, f, indent=2)
-        
-        
-        if use_cache and os.path.exists('/tmp/clan.json'):
-            with open('/tmp/clan.json') as f:
-                clan_data = json.load(f)
+    def load_data(self, use_cache: bool = True, members: MembershipIndex | None = None) -> MembershipIndex:
+        # All the requests go out at once, so this only takes as long as the slowest.
+        # Batch runs pass in members so the group is only loaded once per clan.
+        rp_future = fetcher.submit(cache.get_or_fetch, "runeprofile", self.username, fetch_runeprofile, use_cache)
+        wom_future = fetcher.submit(cache.get_or_fetch, "wom", self.username, fetch_wom, use_cache)
+
+        if members is None:
+            members = fetcher.submit(load_members, use_cache).result()
+
+        self.rp_response: CachedResponse | None = rp_future.result()
+        self.wom_response: CachedResponse | None = wom_future.result()
+
+        if self.rp_response is None or self.wom_response is None:
+            raise PlayerNotFound(f"{self.username} needs both a RuneProfile and a Wise Old Man profile to be ranked")
+
+        return members
+
+    def find_join_date(self, members: MembershipIndex):
+        # By WOM id where we have it, so a renamed player keeps their tenure
+        join_date = members.join_date(self.username, self.wom_data.get('id'))
+
+        if join_date is None:
+            logger.warning(f"{self.username} isn't in the clan's member list, they won't get tenure points")
         else:
-            clan_data = requests.get("https://api.wiseoldman.net/v2/groups/1169").json()
+            self.join_date = join_date
+            self.known_join_date = True
+
+    def score_key(self) -> str:
+        # Tenure moves with the calendar, so today's date is part of the inputs too
+        inputs = [
+            self.rp_response.digest if self.rp_response else "",
+            self.wom_response.digest if self.wom_response else "",
+            # The fallback join date is the current time to the microsecond,
+            # hashing that would mean a non-member's score never matches
+            self.join_date.isoformat() if self.known_join_date else "",
+            self.now().date().isoformat(),
+            CRITERIA_DIGEST,
+        ]
+
+        return hashlib.sha256("\n".join(inputs).encode()).hexdigest()
+
+    def restore_score(self) -> bool:
+        # Kept around even if it's out of date, it's what set_item_data diffs against.
+        # Scores for some other point in time are never stored, see save_score.
+        entry = cache.load("score", self.username) if self.as_of is None else None
+        self.previous = entry.data if entry is not None else None
+        snapshot = self.previous
+
+        if snapshot is None or snapshot['inputs'] != self.score_key():
+            return False
+
+        self.scores = ScoreVector(snapshot['possible_points'], snapshot['points'])
+        self.tier_requirements = snapshot['tier_requirements']
+
+        self.clan_points = snapshot['clan_points']
+        # The ladder can be configured per run, so only the points are trusted
+        self.rank, self.next_rank, self.points_to_next_rank = ladder.standing(self.clan_points)
 
-            with open('/tmp/clan.json', 'w') as f:
-                json.dump(clan_data, f, indent=2)
-        
-        for member in clan_data['memberships']:
-            if member['player']['displayName'] == self.username:
-                # This isn't accurate but close enough for me
-                self.join_date = datetime.fromisoformat(member['createdAt'])
+        return True
+
+    def save_score(self, state: dict):
+        # A replayed score would replace the live one the next run diffs against
+        if self.as_of is not None:
+            return
+
+        cache.set("score", self.username, {
+            "inputs": self.score_key(),
+            "criteria": CRITERIA_DIGEST,
+            "state": state,
+            "possible_points": self.scores.possible_points,
+            "points": self.scores.points,
+            "tier_requirements": self.tier_requirements,
+            "clan_points": self.clan_points,
+            "rank": self.rank,
+            "next_rank": self.next_rank,
+            "points_to_next_rank": self.points_to_next_rank,
+        })
 
 
     def is_diary_tier_completed(self, diary_type: DiaryEnum) -> bool:
@@ -474,287 +694,620 @@ class Profile():
             ]
         )
 
-    def get_quest_points(self) -> int:
-        quests = self.rp_data['quests']
+    def get_quest_stats(self) -> dict:
+        # One pass over the player's quests for their states (by normalised
+        # name), quest points and miniquests
+        if self._quest_stats is not None:
+            return self._quest_stats
 
-        points = sum([
-            QUESTS.get(quest['name'], 0)
-            for quest in quests
-            if quest['state'] == 2
-        ])
+        states = {}
+        quest_points = 0
+        miniquests = 0
 
-        return points
+        for entry in self.rp_data['quests']:
+            quest = QUEST_TABLE.get(quest_key(entry['name']))
 
-    def get_miniquests_complete(self) -> int:
-        quests = self.rp_data['quests']
+            if quest is None:
+                report_unknown_quest(entry['name'])
+                continue
 
-        points = len([
-            quest
-            for quest in quests
-            if quest['type'] == 2 # Miniquest
-            and quest['state'] == 2 # Completed
-        ])
+            states[quest.key] = entry['state']
 
-        return points
-
-    def set_points_from_specific_quests(self) -> None:
-        quests = self.rp_data['quests']
-
-        for quest in quests:
-            if quest['state'] == 2:
-                match quest['name']:
-                    case "Recipe for Disaster":
-                        self.rfd.complete()
-                    case "Monkey Madness II":
-                        self.monkey_madness_2.complete()
-                    case "Dragon Slayer II":
-                        self.dragon_slayer_2.complete()
-                    case "Song of the Elves":
-                        self.song_of_the_elves.complete()
-                    case "A Kingdom Divided":
-                        self.a_kingdom_divided.complete()
-                    case "Desert Treasure II - The Fallen Empire":
-                        self.desert_treasure_2.complete()
-                    case "While Guthix Sleeps":
-                        self.while_guthix_sleeps.complete()
-                    case _:
-                        pass
-
-
-    def set_combat_achievement_points(self):
-        combat_achievements = self.rp_data['combatAchievementTiers']
-
-        self.combat_achievement_points.points = sum([
-            tier['completedCount'] * tier['id']
-            for tier in combat_achievements
-        ])
+            if entry['state'] == QUEST_COMPLETED:
+                quest_points += quest.points
+                miniquests += quest.miniquest
+
+        self._quest_stats = {
+            "quests": states,
+            "quest_points": quest_points,
+            "miniquests": miniquests,
+        }
+
+        return self._quest_stats
 
+    def get_combat_achievement_tiers(self, points: int) -> list[bool]:
+        # A tier counts as done once you have enough points to have
+        # finished it and every tier below it
         cumulative_points = 0
-        points_per_tier = []
+        tiers_completed = []
 
-        for tier in combat_achievements:
+        for tier in self.rp_data['combatAchievementTiers']:
             cumulative_points += tier['id'] * tier['tasksCount']
-            points_per_tier.append(cumulative_points)
-        
-        if self.combat_achievement_points.points >= points_per_tier[0]:
-            self.easy_combat_achievements.complete()
-        
-        if self.combat_achievement_points.points >= points_per_tier[1]:
-            self.medium_combat_achievements.complete()
+            tiers_completed.append(points >= cumulative_points)
 
-        if self.combat_achievement_points.points >= points_per_tier[2]:
-            self.hard_combat_achievements.complete()
+        return tiers_completed
 
-        if self.combat_achievement_points.points >= points_per_tier[3]:
-            self.elite_combat_achievements.complete()
+    def get_tier_requirements(self) -> dict[str, list[int]]:
+        # How much of the stat it's counted from each tier needs, with every
+        # tier below it done too: combat achievement points, and diary tasks
+        # as what's done now plus whatever is missing up to that tier
+        cumulative_points = 0
+        combat_achievement_points = []
 
-        if self.combat_achievement_points.points >= points_per_tier[4]:
-            self.master_combat_achievements.complete()
+        for tier in self.rp_data['combatAchievementTiers']:
+            cumulative_points += tier['id'] * tier['tasksCount']
+            combat_achievement_points.append(cumulative_points)
 
-        if self.combat_achievement_points.points >= points_per_tier[5]:
-            self.grandmaster_combat_achievements.complete()
+        diary_tasks = sum([tier['completedCount'] for tier in self.rp_data['achievementDiaryTiers']])
+        diary_requirements = []
 
+        for diary_type in DiaryEnum:
+            diary_tasks += sum([
+                diary['tasksCount'] - diary['completedCount']
+                for diary in self.rp_data['achievementDiaryTiers']
+                if diary['tierIndex'] == diary_type.value
+            ])
+            diary_requirements.append(diary_tasks)
 
-    def set_points_from_specific_items(self) -> None:
-        all_items = [item['name'] for item in self.rp_data['items']]
+        return {
+            "combat_achievement_tiers": combat_achievement_points,
+            "diary_tiers": diary_requirements,
+        }
 
-        if "Dragon defender" in all_items:
-            self.dragon_defender.complete()   
+    def get_max_stats(self) -> dict:
+        # The most a player could have of the stats whose cap depends on the game data
+        return {
+            "quest_points": MAX_QUEST_POINTS,
+            "miniquests": MAX_MINIQUESTS,
+            "diary_tasks": sum([
+                tier['tasksCount']
+                for tier in self.rp_data['achievementDiaryTiers']
+            ]),
+            "combat_achievement_points": sum([
+                tier['id'] * tier['tasksCount']
+                for tier in self.rp_data['combatAchievementTiers']
+            ]),
+        }
 
-        if "Fighter torso" in all_items:
-            self.fighter_torso.complete()
+    def get_stats(self, sections=SECTIONS) -> dict:
+        stats = {}
 
-        if "Fire cape" in all_items:
-            self.fire_cape.complete()
+        if "quests" in sections:
+            stats |= self.get_quest_stats()
 
-        if "Vorkath's head" in all_items:
-            self.vorkaths_head.complete()
+        if "diaries" in sections:
+            stats["diary_tasks"] = sum([tier['completedCount'] for tier in self.rp_data['achievementDiaryTiers']])
+            stats["diary_tiers"] = [self.is_diary_tier_completed(tier) for tier in DiaryEnum]
 
-        if "Gauntlet cape" in all_items:
-            self.gauntlet_cape.complete()
+        if "combat_achievements" in sections:
+            combat_achievement_points = sum([
+                tier['completedCount'] * tier['id']
+                for tier in self.rp_data['combatAchievementTiers']
+            ])
+            stats["combat_achievement_points"] = combat_achievement_points
+            stats["combat_achievement_tiers"] = self.get_combat_achievement_tiers(combat_achievement_points)
 
-        if "Thread of elidinis" in all_items:
-            self.thread_of_elidinis.complete()
+        if "items" in sections:
+            stats["items"] = ItemIndex(self.rp_data['items'])
+            stats["clogs"] = len(self.rp_data['items'])
 
-        if "Masori crafting kit" in all_items:
-            self.masori_crafting_kit.complete()
+        if "wom" in sections:
+            stats["ehb"] = self.wom_data['ehb']
+            stats["ehp"] = self.wom_data['ehp']
+            stats["total_level"] = self.wom_data['latestSnapshot']['data']['skills']['overall']['level']
 
-        if "Menaphite ornament kit" in all_items:
-            self.menaphite_ornament_kit.complete()
+        if "tenure" in sections:
+            stats["days_in_clan"] = (self.now() - self.join_date).days
 
-        if "Cursed phalanx" in all_items:
-            self.cursed_phalanx.complete()
+        return stats
 
-        if "Xeric's guard" in all_items:
-            self.xerics_guard.complete()
+    def get_state(self, previous: dict | None = None) -> dict:
+        # Compact copy of everything scoring reads, saved with the score so the
+        # next run can work out what changed. The collection log is compared by
+        # digest, and only sorted into lists for the item diff when it moved.
+        items_digest = hashlib.sha256(dumps(self.rp_data['items'])).hexdigest()
 
-        if "Sinhaza shroud tier 1" in all_items:
-            self.sinhaza_shroud.complete()
+        if previous is not None and previous.get('items') == items_digest:
+            item_names, item_ids = previous['item_names'], previous['item_ids']
+        else:
+            item_names = sorted(item['name'] for item in self.rp_data['items'])
+            item_ids = sorted(item['id'] for item in self.rp_data['items'] if 'id' in item)
 
-        if "Icthlarin's shroud (tier 1)" in all_items:
-            self.icthlarins_shroud.complete()
+        return {
+            "quests": self.get_quest_stats()['quests'],
+            "diaries": [
+                [tier['tierIndex'], tier['completedCount'], tier['tasksCount']]
+                for tier in self.rp_data['achievementDiaryTiers']
+            ],
+            "combat_achievements": [
+                [tier['id'], tier['completedCount'], tier['tasksCount']]
+                for tier in self.rp_data['combatAchievementTiers']
+            ],
+            "items": items_digest,
+            "item_names": item_names,
+            "item_ids": item_ids,
+            "wom": {
+                "ehb": self.wom_data['ehb'],
+                "ehp": self.wom_data['ehp'],
+                "total_level": self.wom_data['latestSnapshot']['data']['skills']['overall']['level'],
+            },
+            "tenure": (self.now() - self.join_date).days,
+        }
 
-        if "Infernal cape" in all_items:
-            self.infernal_cape.complete()
+    def get_affected_criteria(self, previous: dict, state: dict) -> list[int]:
+        changed = {
+            section
+            for section in SECTIONS
+            if previous.get(section) != state[section]
+        }
 
-        if "Dizana's quiver" in all_items:
-            self.dizanas_quiver.complete()
+        if "items" in changed:
+            # Only item rules that mention something added or removed can move
+            changed_items = set(previous.get('item_names', [])) ^ set(state['item_names'])
+            changed_ids = set(previous.get('item_ids', [])) ^ set(state['item_ids'])
+        else:
+            changed_items = changed_ids = set()
 
-                  
-        if [quest['state'] == 2 for quest in self.rp_data['quests'] if quest['name'] == "Mage Arena II"]:
-            self.imbued_god_cape.complete()
-        
-        if all([
-            item in all_items
-            for item in [
-                "Remnant of akkha",
-                "Remnant of ba-ba",
-                "Remnant of kephri",
-                "Remnant of zebak",
-                "Ancient remnant",
-            ]
-        ]):
-            self.toa_remnants.complete()
-        
-        # Cannot currently figure out the two ornament kits from available data:
-        #  * Ancient blood ornament kit
-        #  * Purifying sigil
+        return [
+            index
+            for index, criterion in enumerate(CRITERIA)
+            if criterion.section in changed
+            and (
+                criterion.rule != "item"
+                or not criterion.items.isdisjoint(changed_items)
+                or not criterion.item_ids.isdisjoint(changed_ids)
+            )
+        ]
 
 
     def set_item_data(self):
-        # Quests
-        self.quest_points.points = self.get_quest_points()
-        if self.quest_points.points == self.quest_points.possible_points:
-            self.quest_points.complete()
-        
-        self.miniquests.points = self.get_miniquests_complete()
-        if self.miniquests.points == self.miniquests.possible_points:
-            self.miniquests.complete()
-
-        self.set_points_from_specific_quests()
-
-        # Diaries
-        self.achievements_completed.points = sum(
-            [tier['completedCount'] for tier in self.rp_data['achievementDiaryTiers']]
-        )
+        if self.restored:
+            metrics.count("scores", result="restored")
+            return
+
+        previous = self.previous
+        state = self.get_state(previous.get('state') if previous is not None else None)
+        incremental = previous is not None and previous.get('criteria') == CRITERIA_DIGEST and 'state' in previous
+
+        if incremental:
+            # Start from the last score and only re-evaluate what the new inputs touch
+            affected = self.get_affected_criteria(previous['state'], state)
+            self.scores = ScoreVector(list(previous['possible_points']), list(previous['points']))
+            self.clan_points = previous['clan_points']
+
+            if any(CRITERIA[index].points is None for index in affected):
+                max_stats = self.get_max_stats()
+
+                for index in affected:
+                    if CRITERIA[index].points is None:
+                        self.scores.possible_points[index] = max_stats[CRITERIA[index].stat]
+        else:
+            affected = range(len(CRITERIA))
+            self.clan_points = 0
+
+        metrics.count("scores", result="incremental" if incremental else "full")
+
+        stats = {}
+
+        for section in {CRITERIA[index].section for index in affected} - {None}:
+            with metrics.timer("stats_seconds", section=section):
+                stats |= self.get_stats({section})
+
+        possible_points = self.scores.possible_points
+        points = self.scores.points
+        category_seconds = dict.fromkeys({CRITERIA[index].category for index in affected}, 0.0)
+
+        for index in affected:
+            start = time.perf_counter()
+            rule, criterion = COMPILED_RULES[index]
+            new_points = rule(criterion, stats, possible_points[index])
+            delta = new_points - points[index]
+            category_seconds[criterion.category] += time.perf_counter() - start
+
+            if delta:
+                points[index] = new_points
+                self.clan_points += delta
+
+                if incremental:
+                    self.changes.append(ScoreChange(criterion.key, criterion.name, delta))
+
+        for category, seconds in category_seconds.items():
+            metrics.observe("score_seconds", seconds, category=category)
+
+        self.rank, self.next_rank, self.points_to_next_rank = ladder.standing(self.clan_points)
+        self.tier_requirements = self.get_tier_requirements()
+
+        self.save_score(state)
+
+
+@dataclass(slots=True)
+class RankResult():
+    username: str
+    clan_points: int
+    rank: str
+    next_rank: str | None
+    points_to_next_rank: int | None
+    scores: ScoreVector
+    changes: list[ScoreChange] = field(default_factory=list)
+    # Only known when the whole clan was scored together
+    percentile: float | None = None
+    # Wise Old Man id, which stays the same through renames
+    player_id: int | None = None
+    # Tier stat -> how much of the stat it's counted from each tier needs,
+    # see Profile.get_tier_requirements. The what-if simulator can't suggest
+    # those tiers without it.
+    tier_requirements: dict[str, list[int]] | None = None
+
+    def rank_items(self) -> dict[str, "RankItem"]:
+        return {
+            criterion.key: self.scores.rank_item(index)
+            for index, criterion in enumerate(CRITERIA)
+        }
 
-        if self.achievements_completed.points == self.achievements_completed.possible_points:
-            self.achievements_completed.complete()
-            
-        if self.is_diary_tier_completed(DiaryEnum.EASY):
-            self.easy_diaries.complete()
+    def to_dict(self) -> dict:
+        return {
+            "username": self.username,
+            "clan_points": self.clan_points,
+            "rank": self.rank,
+            "next_rank": self.next_rank,
+            "points_to_next_rank": self.points_to_next_rank,
+            "percentile": self.percentile,
+            "changes": [str(change) for change in self.changes],
+            "criteria": {
+                criterion.key: {
+                    "name": criterion.name,
+                    "category": criterion.category,
+                    "points": self.scores.points[index],
+                    "possible_points": self.scores.possible_points[index],
+                    "completed": self.scores.completed(index),
+                }
+                for index, criterion in enumerate(CRITERIA)
+            },
+        }
 
-        if self.is_diary_tier_completed(DiaryEnum.MEDIUM):
-            self.medium_diaries.complete()
 
-        if self.is_diary_tier_completed(DiaryEnum.HARD):
-            self.hard_diaries.complete()    
+def score_player(username: str, use_cache: bool = True) -> RankResult:
+    profile = Profile(username, use_cache=use_cache)
+    profile.set_item_data()
+    return profile.result()
 
-        if self.is_diary_tier_completed(DiaryEnum.ELITE):
-            self.elite_diaries.complete()
-        
-        # PvM
-        self.set_combat_achievement_points()
-        self.set_points_from_specific_items()
 
-        ehb = int(self.wom_data['ehb'])
-        if ehb >= 1250:
-            self.ehb.complete()
-        else:
-            self.ehb.points = ehb
+def score_member(username: str, members: MembershipIndex, use_cache: bool = True) -> RankResult | None:
+    try:
+        profile = Profile(username, use_cache=use_cache, members=members)
+        profile.set_item_data()
+    except PlayerNotFound as e:
+        logger.warning(f"Skipping {username}: {e}")
+        return None
+    except Exception:
+        logger.exception(f"Failed to score {username}")
+        return None
 
-        # Skilling
-        total_level = self.wom_data['latestSnapshot']['data']['skills']['overall']['level']
+    for change in profile.changes:
+        logger.info(f"{username}: {change}")
 
-        if total_level >= 1250:
-            self.level_1250.complete()
-            
-        if total_level >= 1500:
-            self.level_1500.complete()
+    return profile.result()
 
-        if total_level >= 1750:
-            self.level_1750.complete()
 
-        if total_level >= 2000:
-            self.level_2000.complete()
+def iter_clan(workers: int = 8, use_cache: bool = True) -> Iterator[RankResult | None]:
+    # One group download for the whole clan, then fan out the per-player
+    # fetches. Results come out in the order they finish, not clan order.
+    members = load_members(use_cache)
 
-        if total_level >= 2100:
-            self.level_2100.complete()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(score_member, username, members, use_cache)
+            for username in members.usernames()
+        ]
 
-        if total_level >= 2200:
-            self.level_2200.complete()
+        for done, future in enumerate(as_completed(futures), start=1):
+            yield future.result()
 
-        if total_level >= 2277:
-            self.level_2277.complete()
+            if done % 25 == 0 or done == len(futures):
+                logger.info(f"Scored {done}/{len(futures)} members\n{fetcher.report()}")
 
-        ehp = int(self.wom_data['ehp'])
 
-        if ehp >= 1250:
-            self.ehp.complete()
-        else:
-            self.ehp.points = ehp
+def score_clan(workers: int = 8, use_cache: bool = True) -> list[RankResult]:
+    return rank_clan(list(iter_clan(workers, use_cache)))
 
-        # Misc
-        clogs = len(self.rp_data['items'])
-        self.clogs.points = clogs
 
-        # Can't get music cape from available data I don't think
+def rank_clan(results: list[RankResult | None]) -> list[RankResult]:
+    # Leaderboard order, with everyone's percentile filled in
+    results = sorted(
+        [result for result in results if result is not None],
+        key=lambda result: result.clan_points,
+        reverse=True,
+    )
+    clan_points = [result.clan_points for result in reversed(results)]
 
-        days_in_clan = (datetime.today().replace(tzinfo=UTC) - self.join_date).days
+    for result in results:
+        result.percentile = clan_percentile(result.clan_points, clan_points)
 
-        if days_in_clan >= 30:
-            self.one_month_in_clan.complete()
-            
-        if days_in_clan >= 90:
-            self.three_months_in_clan.complete()
+    return results
 
-        if days_in_clan >= 180:
-            self.six_months_in_clan.complete()
 
-        if days_in_clan >= 365:
-            self.one_year_in_clan.complete()
+def print_leaderboard(results: list[RankResult]):
+    from tabulate import tabulate
 
-        if days_in_clan >= 730:
-            self.two_years_in_clan.complete()
+    display_data = [["#", "Username", "Rank", "Points", "Percentile"]]
 
-        # Set clan points, not great but shot myself in the foot
-        # with the way I set up the RankItem class. Will fix later
-        self.clan_points = sum([
-            getattr(self, attr).points for attr in dir(self)
-            if isinstance(getattr(self, attr), RankItem)
-        ])
+    for position, result in enumerate(results, start=1):
+        percentile = f"{result.percentile:.1f}" if result.percentile is not None else ""
+        display_data.append([position, result.username, result.rank, result.clan_points, percentile])
 
-        ranks = {
-            "Helper": 0,
-            "Sapphire": 500,
-            "Emerald": 1000,
-            "Ruby": 2000,
-            "Diamond": 3500,
-            "Dragonstone": 5000,
-            "Onyx": 6500,
-            "Zenyte": 8250,
-            "Beast": 10000,
-            "Wrath": 12500,
-        }
+    print(tabulate(display_data, headers='firstrow'))
 
-        for rank, pts_required in ranks.items():
-            if self.clan_points >= pts_required:
-                current_rank = rank
-            else:
-                self.rank = current_rank
-                self.next_rank = rank
-                self.points_to_next_rank = pts_required - self.clan_points
-                break
 
 def parse_args():
     parser = argparse.ArgumentParser(description="HI Clan Rank Summary")
-    parser.add_argument('username', type=str, help='OSRS username')
-    parser.add_argument('--use-cache', action='store_true', help='Use the local /tmp cache, do not update from WoM/RuneProfile', default=True)
+    parser.add_argument('username', type=str, nargs='?', help='OSRS username')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached responses and fetch everything again')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the response cache')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='Where to keep cached API responses')
+    parser.add_argument('--clan', action='store_true', help=f'Rank every member of WOM group {CLAN_GROUP_ID} and print a leaderboard')
+    parser.add_argument('--rescore', action='store_true', help='Rescore every member from cached data only, spread across processes')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes for --rescore (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=32, help='Players handed to a --rescore worker at a time')
+    parser.add_argument('--replay', type=str, default=None, metavar='ARCHIVE', help='Rank the clan from a directory or tar bundle of captured payloads, without the network')
+    parser.add_argument('--at', type=str, default=None, help='ISO 8601 time to --replay the clan as of (default: the newest capture)')
+    parser.add_argument('--vector', action='store_true', help='Score --rescore and --replay all at once with NumPy (needs numpy), without per-player change logs or stored scores')
+    parser.add_argument('--capture', type=str, default=None, metavar='ARCHIVE', help='After a --clan run, copy the payloads the members were scored from into ARCHIVE')
+    parser.add_argument('--schedule', action='store_true', help='Keep refreshing members in the background, the most active ones most often, within the rate limits')
+    parser.add_argument('--tick', type=float, default=60, help='Seconds between --schedule rounds')
+    parser.add_argument('--workers', type=int, default=8, help='Number of players to fetch at once in --clan mode')
+    parser.add_argument('--max-per-host', type=int, default=fetcher.max_per_host, help='Maximum requests in flight to each API host')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--retries', type=int, default=fetcher.retries, help='How many times to retry throttled or failed requests')
+    parser.add_argument('--wom-rpm', type=float, default=WOM_RATE_LIMIT, help='Wise Old Man requests per minute budget')
+    parser.add_argument('--runeprofile-rpm', type=float, default=RUNEPROFILE_RATE_LIMIT, help='RuneProfile requests per minute budget')
+    parser.add_argument('--format', choices=['table', 'json', 'ndjson', 'csv'], default='table', help='How to print results. Everything but table is written player by player as they are scored.')
+    parser.add_argument('--stats', action='store_true', help='After a clan leaderboard, print points per category, how many players hold each rank and the top players per criterion')
+    parser.add_argument('--top', type=int, default=5, help='How many players --stats lists per criterion')
+    parser.add_argument('--what-if', type=str, nargs='?', const='', default=None, metavar='RANK', help='Show the fewest criteria that would get the player to RANK (default: the next rank)')
+    parser.add_argument('--ranks', type=str, default=None, help='JSON file mapping rank names to the points they start at, instead of the built in ladder')
+    parser.add_argument('--history', type=str, default=None, help='SQLite file to record every scoring run in (default: ~/.local/share/clan-rank/history.sqlite3)')
+    parser.add_argument('--no-history', action='store_true', help='Do not record this run in the history store')
+    parser.add_argument('--serve', action='store_true', help='Run an HTTP server with GET /rank/{username} and GET /clan/leaderboard')
+    parser.add_argument('--host', type=str, default="127.0.0.1", help='Address to listen on with --serve')
+    parser.add_argument('--port', type=int, default=8169, help='Port to listen on with --serve')
+    parser.add_argument('--result-ttl', type=float, default=300, help='Seconds --serve keeps a scored result in memory')
+    parser.add_argument('--profile', action='store_true', help='Print a breakdown of where the time went when the run finishes')
+    parser.add_argument('--metrics-file', type=str, default=None, help='Write the run\'s timings and counters to this file when it finishes')
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json', help='Format for --metrics-file')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every request')
+
+    args = parser.parse_args()
+
+    if not (args.clan or args.serve or args.rescore or args.replay or args.schedule) and args.username is None:
+        parser.error("a username is required unless --clan, --rescore, --replay, --schedule or --serve is given")
+
+    if args.at is not None and args.replay is None:
+        parser.error("--at only works with --replay")
+
+    if args.at is not None:
+        from replay import parse_time
+
+        args.at = parse_time(args.at)
+
+        if args.at is None:
+            parser.error("--at must be an ISO 8601 date or time")
+
+    if args.capture is not None and not args.clan:
+        parser.error("--capture only works with --clan")
+
+    if args.vector and not (args.rescore or args.replay):
+        parser.error("--vector only works with --rescore or --replay")
+
+    if args.vector and importlib.util.find_spec('numpy') is None:
+        parser.error("--vector needs numpy (pip install .[vector])")
+
+    if args.what_if is not None and (args.clan or args.serve or args.rescore or args.replay or args.schedule):
+        parser.error("--what-if only works for a single player")
+
+    if args.what_if is not None and args.format != 'table':
+        parser.error("--what-if is only shown with --format table")
+
+    if args.stats and not (args.clan or args.rescore or args.replay):
+        parser.error("--stats only works with --clan, --rescore or --replay")
+
+    if args.stats and args.format != 'table':
+        parser.error("--stats is only shown with --format table")
+
+    if args.top < 1:
+        parser.error("--top must be at least 1")
+
+    if args.wom_rpm <= 0 or args.runeprofile_rpm <= 0:
+        parser.error("--wom-rpm and --runeprofile-rpm must be above 0")
+
+    if args.retries < 0:
+        parser.error("--retries can't be negative")
+
+    if args.max_per_host < 1:
+        parser.error("--max-per-host must be at least 1")
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    if args.processes is not None and args.processes < 1:
+        parser.error("--processes must be at least 1")
+
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+
+    if args.rescore and args.no_cache:
+        parser.error("--rescore only works from the cache, it can't be combined with --no-cache")
+
+    if args.capture is not None and args.no_cache:
+        parser.error("--capture copies from the cache, it can't be combined with --no-cache")
+
+    if args.schedule and args.no_cache:
+        parser.error("--schedule keeps its state in the cache, it can't be combined with --no-cache")
+
+    return args
+
+
+def render_clan(results: Iterable[RankResult | None], args) -> list[RankResult]:
+    # The table needs everyone ranked first, the other formats go out as
+    # players finish and are only ranked afterwards
+    if args.format == 'table':
+        board = None
+
+        if args.stats:
+            from leaderboard import Leaderboard, print_stats
+
+            # Tallied while the results come in, not in another pass after
+            board = Leaderboard(args.top)
+            results = board.tally(results)
+
+        results = rank_clan(list(results))
+
+        with metrics.timer("render_seconds", view="leaderboard"):
+            print_leaderboard(results)
+
+            if board is not None:
+                print()
+                print_stats(board)
+
+        return results
+
+    from output import stream_results
+
+    return rank_clan(stream_results(results, args.format, sys.stdout))
+
+
+def record_history(results: list[RankResult], args, scored_at: datetime | None = None):
+    if args.no_history:
+        return
+
+    from history import DEFAULT_HISTORY_PATH, HistoryStore
+
+    try:
+        store = HistoryStore(args.history or DEFAULT_HISTORY_PATH)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    store.record(results, scored_at)
+    store.close()
+
+
+def report_metrics(args):
+    if args.profile:
+        print(f"\n{metrics.report()}\n\n{fetcher.report()}", file=sys.stderr)
+
+    if args.metrics_file:
+        with open(args.metrics_file, 'w') as f:
+            if args.metrics_format == 'prometheus':
+                f.write(metrics.to_prometheus())
+            else:
+                json.dump(metrics.to_dict(), f, indent=2)
+
+
+def main():
+    args = parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    fetcher.max_per_host = args.max_per_host
+    fetcher.timeout = args.timeout
+    fetcher.retries = args.retries
+    fetcher.rate_limits[urlsplit(WOM_URL).netloc] = args.wom_rpm
+    fetcher.rate_limits[urlsplit(RUNEPROFILE_URL).netloc] = args.runeprofile_rpm
+
+    cache.directory = args.cache_dir
+    cache.enabled = not args.no_cache
+    cache.refresh = args.refresh
+
+    if args.ranks:
+        with open(args.ranks) as f:
+            ladder.set_ranks(json.load(f))
+
+    # Checked before anything is fetched, --ranks can change what's valid
+    if args.what_if and args.what_if not in ladder.positions:
+        sys.exit(f"Unknown rank {args.what_if!r}, expected one of {', '.join(ladder.names)}")
+
+    if args.serve:
+        from server import RankService, ResultCache, serve
+
+        service = RankService(ResultCache(ttl=args.result_ttl), workers=args.workers)
+        serve(args.host, args.port, service)
+    elif args.schedule:
+        from scheduler import RefreshScheduler
+
+        try:
+            RefreshScheduler(args.tick, args.workers).run(on_results=lambda results: record_history(results, args))
+        except KeyboardInterrupt:
+            pass
+    elif args.replay:
+        import tarfile
+        from replay import replay_members
+
+        try:
+            scored_at, results = replay_members(args.replay, args.at, vector=args.vector)
+        except (LookupError, OSError, tarfile.ReadError) as e:
+            sys.exit(str(e))
+
+        results = render_clan(results, args)
+
+        # Replaces whatever history has for that time, that's how a rule
+        # change gets applied to the past
+        record_history(results, args, scored_at)
+    elif args.rescore:
+        try:
+            members = load_cached_members()
+        except LookupError as e:
+            sys.exit(str(e))
+
+        if args.vector:
+            from vector import rescore
+
+            scored = rescore(members.usernames(), members)
+        else:
+            from batch import rescore
+
+            scored = rescore(members.usernames(), members, args.processes, args.chunk_size)
+
+        results = render_clan(scored, args)
+
+        record_history(results, args)
+    elif args.clan:
+        results = render_clan(iter_clan(workers=args.workers), args)
+
+        record_history(results, args)
+
+        if args.capture:
+            from replay import capture
+
+            target = capture(args.capture, [result.username for result in results])
+            logger.info(f"Captured the clan's payloads in {target}")
+    else:
+        profile = Profile(args.username)
+        profile.set_item_data()
+
+        if args.format == 'table':
+            with metrics.timer("render_seconds", view="summary"):
+                profile.print_summary()
+        else:
+            from output import stream_results
+
+            stream_results([profile.result()], args.format, sys.stdout)
+
+        if args.what_if is not None:
+            from simulator import print_simulation
+
+            with metrics.timer("render_seconds", view="what_if"):
+                print_simulation(profile.result(), args.what_if or None)
 
-    return parser.parse_args()
+        record_history([profile.result()], args)
 
-args = parse_args()
+    report_metrics(args)
 
-profile = Profile(args.username, use_cache=args.use_cache)
-profile.set_item_data()
-profile.print_summary()
@@ -0,0 +1,81 @@
+MAX_CLOGS = 1594
+
+# Every rank criterion, in the order they're shown. Adding a criterion is one
+# entry here. Rules:
+#
+#   quest      - 'points' once 'quest' is completed
+#   item       - 'points' once every one of 'items' (names) and 'item_ids' is
+#                in the collection log
+#   tier       - 'points' once tier number 'tier' of 'stat' is fully complete
+#   threshold  - 'points' once 'stat' reaches 'value'
+#   capped     - 1 point per unit of 'stat' up to 'points'. Without 'points'
+#                the cap is the most of 'stat' the player could have
+#   manual     - can't be worked out from RuneProfile/WOM data yet, always 0
+CRITERIA = [
+  # Quests
+  {"key": "quest_points", "category": "Quests", "name": "Quest Points", "rule": "capped", "stat": "quest_points"},
+  {"key": "miniquests", "category": "Quests", "name": "Miniquests Completed", "rule": "capped", "stat": "miniquests"},
+  {"key": "rfd", "category": "Quests", "name": "Recipe for Disaster", "points": 50, "rule": "quest", "quest": "Recipe for Disaster"},
+  {"key": "monkey_madness_2", "category": "Quests", "name": "Monkey Madness II", "points": 50, "rule": "quest", "quest": "Monkey Madness II"},
+  {"key": "dragon_slayer_2", "category": "Quests", "name": "Dragon Slayer II", "points": 100, "rule": "quest", "quest": "Dragon Slayer II"},
+  {"key": "song_of_the_elves", "category": "Quests", "name": "Song of the Elves", "points": 50, "rule": "quest", "quest": "Song of the Elves"},
+  {"key": "a_kingdom_divided", "category": "Quests", "name": "A Kingdom Divided", "points": 50, "rule": "quest", "quest": "A Kingdom Divided"},
+  {"key": "desert_treasure_2", "category": "Quests", "name": "Desert Treasure II", "points": 100, "rule": "quest", "quest": "Desert Treasure II - The Fallen Empire"},
+  {"key": "while_guthix_sleeps", "category": "Quests", "name": "While Guthix Sleeps", "points": 50, "rule": "quest", "quest": "While Guthix Sleeps"},
+
+  # Diaries
+  {"key": "achievements_completed", "category": "Diaries", "name": "Achievement Diaries Completed", "rule": "capped", "stat": "diary_tasks"},
+  {"key": "easy_diaries", "category": "Diaries", "name": "Easy Diaries", "points": 50, "rule": "tier", "stat": "diary_tiers", "tier": 0},
+  {"key": "medium_diaries", "category": "Diaries", "name": "Medium Diaries", "points": 50, "rule": "tier", "stat": "diary_tiers", "tier": 1},
+  {"key": "hard_diaries", "category": "Diaries", "name": "Hard Diaries", "points": 100, "rule": "tier", "stat": "diary_tiers", "tier": 2},
+  {"key": "elite_diaries", "category": "Diaries", "name": "Elite Diaries", "points": 200, "rule": "tier", "stat": "diary_tiers", "tier": 3},
+
+  # PvM
+  {"key": "combat_achievement_points", "category": "PvM", "name": "Combat Achievement Points", "rule": "capped", "stat": "combat_achievement_points"},
+  {"key": "easy_combat_achievements", "category": "PvM", "name": "Easy Combat Achievements", "points": 50, "rule": "tier", "stat": "combat_achievement_tiers", "tier": 0},
+  {"key": "medium_combat_achievements", "category": "PvM", "name": "Medium Combat Achievements", "points": 50, "rule": "tier", "stat": "combat_achievement_tiers", "tier": 1},
+  {"key": "hard_combat_achievements", "category": "PvM", "name": "Hard Combat Achievements", "points": 100, "rule": "tier", "stat": "combat_achievement_tiers", "tier": 2},
+  {"key": "elite_combat_achievements", "category": "PvM", "name": "Elite Combat Achievements", "points": 100, "rule": "tier", "stat": "combat_achievement_tiers", "tier": 3},
+  {"key": "master_combat_achievements", "category": "PvM", "name": "Master Combat Achievements", "points": 200, "rule": "tier", "stat": "combat_achievement_tiers", "tier": 4},
+  {"key": "grandmaster_combat_achievements", "category": "PvM", "name": "Grandmaster Combat Achievements", "points": 300, "rule": "tier", "stat": "combat_achievement_tiers", "tier": 5},
+  {"key": "dragon_defender", "category": "PvM", "name": "Dragon Defender", "points": 50, "rule": "item", "items": ["Dragon defender"]},
+  {"key": "fighter_torso", "category": "PvM", "name": "Fighter Torso", "points": 50, "rule": "item", "items": ["Fighter torso"]},
+  {"key": "fire_cape", "category": "PvM", "name": "Fire Cape", "points": 100, "rule": "item", "items": ["Fire cape"]},
+  {"key": "imbued_god_cape", "category": "PvM", "name": "Imbued God Cape", "points": 50, "rule": "quest", "quest": "Mage Arena II"},
+  {"key": "vorkaths_head", "category": "PvM", "name": "Vorkath's Head", "points": 50, "rule": "item", "items": ["Vorkath's head"]},
+  {"key": "gauntlet_cape", "category": "PvM", "name": "Gauntlet Cape", "points": 50, "rule": "item", "items": ["Gauntlet cape"]},
+  {"key": "thread_of_elidinis", "category": "PvM", "name": "Thread of Elidinis", "points": 50, "rule": "item", "items": ["Thread of elidinis"]},
+  {"key": "masori_crafting_kit", "category": "PvM", "name": "Masori Crafting Kit", "points": 25, "rule": "item", "items": ["Masori crafting kit"]},
+  {"key": "menaphite_ornament_kit", "category": "PvM", "name": "Menaphite Ornament Kit", "points": 25, "rule": "item", "items": ["Menaphite ornament kit"]},
+  {"key": "cursed_phalanx", "category": "PvM", "name": "Cursed Phalanx", "points": 50, "rule": "item", "items": ["Cursed phalanx"]},
+  {"key": "toa_remnants", "category": "PvM", "name": "ToA Remnants", "points": 200, "rule": "item", "items": ["Remnant of akkha", "Remnant of ba-ba", "Remnant of kephri", "Remnant of zebak", "Ancient remnant"]},
+  {"key": "xerics_guard", "category": "PvM", "name": "Xeric's Guard", "points": 200, "rule": "item", "items": ["Xeric's guard"]},
+  {"key": "sinhaza_shroud", "category": "PvM", "name": "Sinhaza Shroud", "points": 200, "rule": "item", "items": ["Sinhaza shroud tier 1"]},
+  {"key": "icthlarins_shroud", "category": "PvM", "name": "Icthlarin's Shroud", "points": 200, "rule": "item", "items": ["Icthlarin's shroud (tier 1)"]},
+  {"key": "infernal_cape", "category": "PvM", "name": "Infernal Cape", "points": 200, "rule": "item", "items": ["Infernal cape"]},
+  {"key": "dizanas_quiver", "category": "PvM", "name": "Dizana's Quiver", "points": 200, "rule": "item", "items": ["Dizana's quiver"]},
+  # Cannot currently figure out the two ornament kits from available data
+  {"key": "ancient_blood_ornament_kit", "category": "PvM", "name": "Ancient Blood Ornament Kit", "points": 300, "rule": "manual"},
+  {"key": "purifying_sigil", "category": "PvM", "name": "Purifying Sigil", "points": 300, "rule": "manual"},
+  {"key": "ehb", "category": "PvM", "name": "EHB", "points": 1250, "rule": "capped", "stat": "ehb"},
+
+  # Skilling
+  {"key": "level_1250", "category": "Skilling", "name": "1250 Total Level", "points": 100, "rule": "threshold", "stat": "total_level", "value": 1250},
+  {"key": "level_1500", "category": "Skilling", "name": "1500 Total Level", "points": 100, "rule": "threshold", "stat": "total_level", "value": 1500},
+  {"key": "level_1750", "category": "Skilling", "name": "1750 Total Level", "points": 100, "rule": "threshold", "stat": "total_level", "value": 1750},
+  {"key": "level_2000", "category": "Skilling", "name": "2000 Total Level", "points": 200, "rule": "threshold", "stat": "total_level", "value": 2000},
+  {"key": "level_2100", "category": "Skilling", "name": "2100 Total Level", "points": 200, "rule": "threshold", "stat": "total_level", "value": 2100},
+  {"key": "level_2200", "category": "Skilling", "name": "2200 Total Level", "points": 250, "rule": "threshold", "stat": "total_level", "value": 2200},
+  {"key": "level_2277", "category": "Skilling", "name": "2277 Total Level", "points": 300, "rule": "threshold", "stat": "total_level", "value": 2277},
+  {"key": "ehp", "category": "Skilling", "name": "EHP", "points": 1250, "rule": "capped", "stat": "ehp"},
+
+  # Miscellaneous
+  {"key": "clogs", "category": "Miscellaneous", "name": "Collections Logged", "points": MAX_CLOGS, "rule": "capped", "stat": "clogs"},
+  # Can't get music cape from available data I don't think
+  {"key": "music_cape", "category": "Miscellaneous", "name": "Music Cape", "points": 50, "rule": "manual"},
+  {"key": "one_month_in_clan", "category": "Miscellaneous", "name": "1 Month in Clan", "points": 30, "rule": "threshold", "stat": "days_in_clan", "value": 30},
+  {"key": "three_months_in_clan", "category": "Miscellaneous", "name": "3 Months in Clan", "points": 90, "rule": "threshold", "stat": "days_in_clan", "value": 90},
+  {"key": "six_months_in_clan", "category": "Miscellaneous", "name": "6 Months in Clan", "points": 180, "rule": "threshold", "stat": "days_in_clan", "value": 180},
+  {"key": "one_year_in_clan", "category": "Miscellaneous", "name": "1 Year in Clan", "points": 360, "rule": "threshold", "stat": "days_in_clan", "value": 365},
+  {"key": "two_years_in_clan", "category": "Miscellaneous", "name": "2 Years in Clan", "points": 720, "rule": "threshold", "stat": "days_in_clan", "value": 730},
+]
@@ -1,3 +1,6 @@
+# Quest points for every quest, by the name RuneProfile reports. Names are
+# matched on a normalised key (case, punctuation and "&" vs "and" don't
+# matter), anything still missing is logged when a player has it.
 QUESTS = {
   "Below Ice Mountain": 1,
   "Black Knights' Fortress": 3,
@@ -170,3 +173,34 @@ QUESTS = {
   "Witch's House": 4,
   "Zogre Flesh Eaters": 1,
 }
+
+# Miniquests give no quest points but count towards "Miniquests Completed"
+MINIQUESTS = [
+  "Alfred Grimhand's Barcrawl",
+  "Architectural Alliance",
+  "Barbarian Training",
+  "Bear Your Soul",
+  "Curse of the Empty Lord",
+  "Daddy's Home",
+  "Enchanted Key",
+  "Enter the Abyss",
+  "Family Pest",
+  "The Frozen Door",
+  "The General's Shadow",
+  "His Faithful Servants",
+  "Hopespear's Will",
+  "Into the Tombs",
+  "Lair of Tarn Razorlor",
+  "Mage Arena I",
+  "Mage Arena II",
+  "Skippy and the Mogres",
+]
+
+# Other names the same quest goes by, e.g. in data/criteria.py or older
+# RuneProfile payloads
+QUEST_ALIASES = {
+  "Desert Treasure": "Desert Treasure I",
+  "Desert Treasure II": "Desert Treasure II - The Fallen Empire",
+  "Dragon Slayer": "Dragon Slayer I",
+  "Mage Arena": "Mage Arena I",
+}
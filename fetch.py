@@ -0,0 +1,257 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from metrics import metrics
+
+# requests is imported where it's first needed, it's one of the slower
+# things to import and plenty of runs are served from the cache
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger('ClanRank')
+
+# (connect, read) in seconds
+DEFAULT_TIMEOUT = (5, 30)
+DEFAULT_MAX_PER_HOST = 4
+DEFAULT_RETRIES = 4
+# Seconds, doubled on each retry and then jittered
+BACKOFF_BASE = 1
+BACKOFF_MAX = 60
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after(response: "requests.Response") -> float | None:
+    value = response.headers.get('Retry-After')
+
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter():
+    # Token bucket: refills at per_minute / 60 tokens a second and holds at most
+    # `burst` of them. Tokens can go negative, which is just the queue of callers
+    # that have already been given a slot in the future.
+    def __init__(self, per_minute: float, burst: int = 1) -> None:
+        self.rate = per_minute / 60
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+
+            wait = max(-self._tokens / self.rate, self._paused_until - now, 0)
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+    def pause(self, seconds: float):
+        # The server told us to back off, so nobody on this host goes until then
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0)
+
+
+class HostStats():
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.wait_time = 0.0
+
+    def throughput(self) -> float:
+        return self.requests / max(time.monotonic() - self.started, 1e-9)
+
+
+# Keeps a pooled keep-alive session per API host and caps the number of
+# requests in flight to each one, so batch runs don't hammer WOM/RuneProfile.
+# Hosts with a requests-per-minute budget are paced to it, and 429s/5xx/
+# connection errors are retried with jittered exponential backoff.
+class Fetcher():
+    def __init__(
+        self,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        timeout: float | tuple[float, float] = DEFAULT_TIMEOUT,
+        workers: int = 16,
+        rate_limits: dict[str, float] | None = None,
+        retries: int = DEFAULT_RETRIES,
+    ) -> None:
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.workers = workers
+        # host -> requests per minute, hosts not listed aren't paced
+        self.rate_limits = rate_limits or {}
+        self.retries = retries
+
+        self._sessions: dict[str, "requests.Session"] = {}
+        self._limits: dict[str, threading.BoundedSemaphore] = {}
+        self._limiters: dict[str, RateLimiter] = {}
+        self._stats: dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+        self._pool: ThreadPoolExecutor | None = None
+
+    def _host(self, host: str) -> tuple["requests.Session", threading.BoundedSemaphore]:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with self._lock:
+            if host not in self._sessions:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_per_host)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+
+                self._sessions[host] = session
+                self._limits[host] = threading.BoundedSemaphore(self.max_per_host)
+                self._stats[host] = HostStats()
+
+                if host in self.rate_limits:
+                    self._limiters[host] = RateLimiter(self.rate_limits[host])
+
+            return self._sessions[host], self._limits[host]
+
+    def _send(self, host: str, url: str, **kwargs) -> "requests.Response":
+        session, limit = self._host(host)
+        limiter = self._limiters.get(host)
+        stats = self._stats[host]
+
+        wait = 0
+
+        with self._lock:
+            stats.waiting += 1
+
+        try:
+            wait = limiter.acquire() if limiter else 0
+            limit.acquire()
+        finally:
+            with self._lock:
+                stats.waiting -= 1
+                stats.wait_time += wait
+
+        if limiter:
+            metrics.observe("rate_limit_wait_seconds", wait, host=host)
+
+        with self._lock:
+            stats.in_flight += 1
+            stats.requests += 1
+
+        try:
+            # Only the request itself, not the pacing and queueing before it
+            with metrics.timer("fetch_seconds", host=host):
+                return session.get(url, **kwargs)
+        finally:
+            limit.release()
+            with self._lock:
+                stats.in_flight -= 1
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        import requests
+
+        host = urlsplit(url).netloc
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            delay = None
+
+            try:
+                response = self._send(host, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise
+                logger.warning(f"{url} failed ({e.__class__.__name__}), retrying")
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+
+                delay = retry_after(response)
+                logger.warning(f"{url} returned {response.status_code}, retrying")
+
+                if response.status_code == 429:
+                    with self._lock:
+                        self._stats[host].throttled += 1
+
+                    if delay is not None and host in self._limiters:
+                        self._limiters[host].pause(delay)
+
+            with self._lock:
+                self._stats[host].retries += 1
+
+            # Honour Retry-After when given, otherwise full-jitter exponential backoff
+            if delay is None:
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            else:
+                delay += random.uniform(0, BACKOFF_BASE)
+
+            time.sleep(delay)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fetch')
+
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def stats(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                host: {
+                    "requests": stats.requests,
+                    "retries": stats.retries,
+                    "throttled": stats.throttled,
+                    "queued": stats.waiting,
+                    "in_flight": stats.in_flight,
+                    "requests_per_second": round(stats.throughput(), 2),
+                    "seconds_waiting_for_budget": round(stats.wait_time, 2),
+                }
+                for host, stats in self._stats.items()
+            }
+
+    def report(self) -> str:
+        return "\n".join(
+            f"{host}: {stats['requests']} requests ({stats['requests_per_second']}/s), "
+            f"{stats['retries']} retries, {stats['throttled']} throttled, "
+            f"{stats['queued']} queued, {stats['in_flight']} in flight"
+            for host, stats in self.stats().items()
+        )
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+        for session in self._sessions.values():
+            session.close()
+
+        self._sessions.clear()
+        self._limits.clear()
+        self._limiters.clear()
@@ -0,0 +1,185 @@
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, UTC
+
+from clan_rank import CRITERIA, RankResult, ladder
+
+DEFAULT_HISTORY_PATH = os.path.join(
+    os.environ.get('XDG_DATA_HOME', os.path.expanduser('~/.local/share')),
+    'clan-rank',
+    'history.sqlite3',
+)
+
+logger = logging.getLogger('ClanRank')
+
+# Bumped when the tables change shape
+SCHEMA_VERSION = 1
+
+# Times are stored as unix seconds. Players are their WOM id, which survives
+# renames, with the name they had at the time kept alongside. scores is keyed
+# (player_id, scored_at, criterion) so "one player over time" is a range scan
+# on the primary key, and the criterion index covers "one criterion across
+# the clan over time".
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS criteria (
+    key TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS totals (
+    player_id INTEGER NOT NULL,
+    scored_at REAL NOT NULL,
+    name TEXT NOT NULL,
+    clan_points INTEGER NOT NULL,
+    rank TEXT NOT NULL,
+    PRIMARY KEY (player_id, scored_at)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS totals_time ON totals (scored_at);
+CREATE INDEX IF NOT EXISTS totals_name ON totals (name COLLATE NOCASE, scored_at);
+
+CREATE TABLE IF NOT EXISTS scores (
+    player_id INTEGER NOT NULL,
+    scored_at REAL NOT NULL,
+    criterion TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    PRIMARY KEY (player_id, scored_at, criterion)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS scores_criterion_time ON scores (criterion, scored_at);
+"""
+
+
+def timestamp(when: datetime | None) -> float:
+    return (when or datetime.now(UTC)).timestamp()
+
+
+class HistoryStore():
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH) -> None:
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        # 0 is a new, empty file
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+
+        if version not in (0, SCHEMA_VERSION):
+            self._db.close()
+            raise ValueError(f"History in {path} has schema version {version}, this version of clan-rank reads {SCHEMA_VERSION}")
+
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO criteria (key, category, name) VALUES (?, ?, ?)",
+                [(criterion.key, criterion.category, criterion.name) for criterion in CRITERIA],
+            )
+
+    def close(self):
+        self._db.close()
+
+    def record(self, results: list[RankResult], scored_at: datetime | None = None):
+        at = timestamp(scored_at)
+        missing = [result.username for result in results if result.player_id is None]
+
+        if missing:
+            logger.warning(f"Not recording {', '.join(missing)}, their Wise Old Man id isn't known")
+            results = [result for result in results if result.player_id is not None]
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO totals (player_id, scored_at, name, clan_points, rank) VALUES (?, ?, ?, ?, ?)",
+                [(result.player_id, at, result.username, result.clan_points, result.rank) for result in results],
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO scores (player_id, scored_at, criterion, points) VALUES (?, ?, ?, ?)",
+                [
+                    (result.player_id, at, criterion.key, result.scores.points[index])
+                    for result in results
+                    for index, criterion in enumerate(CRITERIA)
+                ],
+            )
+
+    def player_id(self, player: int | str) -> int | None:
+        # Ids as they are, names by whoever last went by it
+        if isinstance(player, int):
+            return player
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT player_id FROM totals WHERE name = ? COLLATE NOCASE ORDER BY scored_at DESC LIMIT 1",
+                (player,),
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def points_over_time(
+        self,
+        player: int | str,
+        criterion: str | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> list[tuple[datetime, int]]:
+        # Clan points, or one criterion's points, for every recorded run in
+        # the range. Covers every name the player had, looked up by any of them.
+        player = self.player_id(player)
+        start_at = start.timestamp() if start else float('-inf')
+        end_at = end.timestamp() if end else float('inf')
+
+        with self._lock:
+            if criterion is None:
+                rows = self._db.execute(
+                    "SELECT scored_at, clan_points FROM totals"
+                    " WHERE player_id = ? AND scored_at BETWEEN ? AND ? ORDER BY scored_at",
+                    (player, start_at, end_at),
+                ).fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT scored_at, points FROM scores"
+                    " WHERE player_id = ? AND scored_at BETWEEN ? AND ? AND criterion = ? ORDER BY scored_at",
+                    (player, start_at, end_at, criterion),
+                ).fetchall()
+
+        return [(datetime.fromtimestamp(at, UTC), points) for at, points in rows]
+
+    def ranked_up_since(self, since: datetime) -> list[tuple[str, str, str]]:
+        # (current name, rank at `since`, rank now) for everyone whose rank
+        # went up. Players first recorded after `since` aren't included.
+        query = """
+            SELECT now.name, before.rank, now.rank FROM (
+                SELECT player_id, rank, MAX(scored_at) FROM totals WHERE scored_at <= ? GROUP BY player_id
+            ) AS before JOIN (
+                SELECT player_id, name, rank, MAX(scored_at) FROM totals GROUP BY player_id
+            ) AS now USING (player_id)
+        """
+        with self._lock:
+            rows = self._db.execute(query, (since.timestamp(),)).fetchall()
+
+        return [
+            (player, old_rank, new_rank)
+            for player, old_rank, new_rank in rows
+            if ladder.positions.get(new_rank, -1) > ladder.positions.get(old_rank, -1)
+        ]
+
+    def category_totals(self, at: datetime | None = None) -> dict[str, int]:
+        # Clan-wide points per category, using each player's latest run at or before `at`
+        query = """
+            SELECT criteria.category, SUM(scores.points) FROM (
+                SELECT player_id, MAX(scored_at) AS scored_at FROM totals WHERE scored_at <= ? GROUP BY player_id
+            ) AS latest
+            JOIN scores ON scores.player_id = latest.player_id AND scores.scored_at = latest.scored_at
+            JOIN criteria ON criteria.key = scores.criterion
+            GROUP BY criteria.category
+        """
+
+        with self._lock:
+            rows = self._db.execute(query, (timestamp(at),)).fetchall()
+
+        return dict(rows)
@@ -0,0 +1,130 @@
+# Clan-wide rollups built up one result at a time: points per category, how
+# many players hold each rank, and the top few players overall and on every
+# criterion. Each add is a pass over one ScoreVector plus a bounded heap push
+# per criterion, so a clan run has it ready the moment the last player is
+# scored instead of going over everyone again afterwards.
+import heapq
+from collections import Counter
+from collections.abc import Iterable, Iterator
+
+from clan_rank import CRITERIA, RankResult, ladder
+
+DEFAULT_TOP = 5
+
+# Same grouping and order as the per-player summary
+CATEGORIES = list(dict.fromkeys(criterion.category for criterion in CRITERIA))
+CATEGORY_OF = [CATEGORIES.index(criterion.category) for criterion in CRITERIA]
+
+
+class Leaderboard():
+    def __init__(self, top: int = DEFAULT_TOP) -> None:
+        self.top = top
+        self.players = 0
+        self.clan_points = 0
+        self.category_points = [0] * len(CATEGORIES)
+        self.category_possible = [0] * len(CATEGORIES)
+        self.ranks: Counter[str] = Counter()
+        # Min-heaps of at most `top` entries, the smallest is the one to beat.
+        # Ties on a criterion go to whoever has more clan points.
+        self._top_players: list[tuple[int, str, str]] = []
+        self._top_criteria: list[list[tuple[int, int, str]]] = [[] for _ in CRITERIA]
+
+    def add(self, result: RankResult):
+        self.players += 1
+        self.clan_points += result.clan_points
+        self.ranks[result.rank] += 1
+
+        push(self._top_players, (result.clan_points, result.username, result.rank), self.top)
+
+        category_points = self.category_points
+        category_possible = self.category_possible
+
+        for index, (points, possible_points) in enumerate(zip(result.scores.points, result.scores.possible_points)):
+            category_points[CATEGORY_OF[index]] += points
+            category_possible[CATEGORY_OF[index]] += possible_points
+
+            # Nobody needs to see who's top on zero
+            if points:
+                push(self._top_criteria[index], (points, result.clan_points, result.username), self.top)
+
+    def tally(self, results: Iterable[RankResult | None]) -> Iterator[RankResult | None]:
+        # Passes results straight through, adding each one on the way
+        for result in results:
+            if result is not None:
+                self.add(result)
+
+            yield result
+
+    def top_players(self) -> list[tuple[int, str, str]]:
+        # (clan points, username, rank), best first
+        return sorted(self._top_players, reverse=True)
+
+    def top_criterion(self, index: int) -> list[tuple[int, int, str]]:
+        # (points, clan points, username), best first
+        return sorted(self._top_criteria[index], reverse=True)
+
+    def rank_counts(self) -> dict[str, int]:
+        # Every rank on the ladder, lowest first, including empty ones
+        return {name: self.ranks[name] for name in ladder.names}
+
+    def to_dict(self) -> dict:
+        return {
+            "players": self.players,
+            "clan_points": self.clan_points,
+            "mean_points": self.clan_points / self.players if self.players else 0,
+            "ranks": self.rank_counts(),
+            "categories": {
+                category: {
+                    "points": self.category_points[position],
+                    "possible_points": self.category_possible[position],
+                    "mean_points": self.category_points[position] / self.players if self.players else 0,
+                }
+                for position, category in enumerate(CATEGORIES)
+            },
+            "top": [
+                {"username": username, "rank": rank, "clan_points": clan_points}
+                for clan_points, username, rank in self.top_players()
+            ],
+            "criteria": {
+                criterion.key: [
+                    {"username": username, "points": points}
+                    for points, _, username in self.top_criterion(index)
+                ]
+                for index, criterion in enumerate(CRITERIA)
+            },
+        }
+
+
+def push(heap: list, entry: tuple, size: int):
+    if len(heap) < size:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+
+def print_stats(board: Leaderboard):
+    from tabulate import tabulate
+
+    category_rows = [
+        [
+            category,
+            board.category_points[position],
+            board.category_possible[position],
+            f"{board.category_points[position] / board.players:.0f}" if board.players else "",
+            f"{100 * board.category_points[position] / board.category_possible[position]:.1f}" if board.category_possible[position] else "",
+        ]
+        for position, category in enumerate(CATEGORIES)
+    ]
+    criterion_rows = [
+        [criterion.name, ", ".join(f"{username} ({points})" for points, _, username in top)]
+        for index, criterion in enumerate(CRITERIA)
+        if (top := board.top_criterion(index))
+    ]
+
+    print(f"{board.players} players, {board.clan_points} pts in total")
+    print()
+    print(tabulate(category_rows, headers=["Category", "Points", "Possible Points", "Mean", "% of Possible"]))
+    print()
+    print(tabulate(list(board.rank_counts().items()), headers=["Rank", "Players"]))
+    print()
+    print(tabulate(criterion_rows, headers=["Criteria", f"Top {board.top}"]))
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from cache import normalize_username
+
+
+class MembershipIndex():
+    # Clan members by WOM player id. Looking someone up by id survives name
+    # changes, names are only used for payloads that don't carry an id.
+    def __init__(
+        self,
+        joined: dict[int, datetime] | None = None,
+        display_names: dict[int, str] | None = None,
+    ) -> None:
+        self.joined = joined or {}
+        # Current display name per member, in group order
+        self.display_names = display_names or {}
+        # Normalised current name -> player id. Not old names, anyone can
+        # take a name a member used to go by.
+        self.names = {normalize_username(name): player_id for player_id, name in self.display_names.items()}
+
+    @classmethod
+    def from_group(cls, clan_data: dict) -> "MembershipIndex":
+        joined = {}
+        display_names = {}
+
+        for member in clan_data['memberships']:
+            player_id = member['player']['id']
+            # This isn't accurate but close enough for me
+            joined[player_id] = datetime.fromisoformat(member['createdAt'])
+            display_names[player_id] = member['player']['displayName']
+
+        return cls(joined, display_names)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MembershipIndex":
+        return cls(
+            {int(player_id): datetime.fromisoformat(joined) for player_id, joined in data['joined'].items()},
+            {int(player_id): name for player_id, name in data['display_names'].items()},
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "joined": {str(player_id): joined.isoformat() for player_id, joined in self.joined.items()},
+            "display_names": {str(player_id): name for player_id, name in self.display_names.items()},
+        }
+
+    def __len__(self) -> int:
+        return len(self.joined)
+
+    def usernames(self) -> list[str]:
+        return list(self.display_names.values())
+
+    def player_id(self, username: str) -> int | None:
+        return self.names.get(normalize_username(username))
+
+    def join_date(self, username: str, player_id: int | None = None) -> datetime | None:
+        # By WOM id, only a payload without one falls back to the name
+        if player_id is None:
+            player_id = self.player_id(username)
+
+        return self.joined.get(player_id)
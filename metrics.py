@@ -0,0 +1,143 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Everything is prefixed with this in the Prometheus output
+NAMESPACE = "clan_rank"
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def label_key(labels: dict[str, str]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(labels: Labels) -> str:
+    return " ".join(f"{name}={value}" for name, value in labels)
+
+
+class Metrics():
+    # Counters and timings keyed by name and labels. Always on, recording is a
+    # lock and a dict update so it doesn't show up next to a network request.
+    def __init__(self) -> None:
+        self._counters: dict[tuple[str, Labels], float] = {}
+        # (name, labels) -> [calls, total seconds, slowest call]
+        self._timings: dict[tuple[str, Labels], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1, **labels: str):
+        key = (name, label_key(labels))
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        key = (name, label_key(labels))
+
+        with self._lock:
+            timing = self._timings.setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                "timings": [[name, dict(labels), *timing] for (name, labels), timing in self._timings.items()],
+            }
+
+    def drain(self) -> dict:
+        # Snapshot and reset, for worker processes handing their numbers back
+        snapshot = self.snapshot()
+
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+        return snapshot
+
+    def merge(self, snapshot: dict):
+        with self._lock:
+            for name, labels, value in snapshot['counters']:
+                key = (name, label_key(labels))
+                self._counters[key] = self._counters.get(key, 0) + value
+
+            for name, labels, calls, total, slowest in snapshot['timings']:
+                timing = self._timings.setdefault((name, label_key(labels)), [0, 0.0, 0.0])
+                timing[0] += calls
+                timing[1] += total
+                timing[2] = max(timing[2], slowest)
+
+    def to_dict(self) -> dict:
+        snapshot = self.snapshot()
+
+        return {
+            "counters": [
+                {"name": name, "labels": labels, "value": value}
+                for name, labels, value in snapshot['counters']
+            ],
+            "timings": [
+                {"name": name, "labels": labels, "calls": calls, "seconds": total, "max_seconds": slowest}
+                for name, labels, calls, total, slowest in snapshot['timings']
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timings = sorted(self._timings.items())
+
+        def series(name: str, labels: Labels, value: float) -> str:
+            label_text = ",".join(f'{label}="{value}"' for label, value in labels)
+            return f"{NAMESPACE}_{name}{{{label_text}}} {value}" if label_text else f"{NAMESPACE}_{name} {value}"
+
+        lines = []
+        typed = set()
+
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {NAMESPACE}_{name}_total counter")
+                typed.add(name)
+            lines.append(series(f"{name}_total", labels, value))
+
+        for (name, labels), (calls, total, _) in timings:
+            if name not in typed:
+                lines.append(f"# TYPE {NAMESPACE}_{name} summary")
+                typed.add(name)
+            lines.append(series(f"{name}_count", labels, calls))
+            lines.append(series(f"{name}_sum", labels, round(total, 6)))
+
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> str:
+        from tabulate import tabulate
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timings = sorted(self._timings.items(), key=lambda timing: timing[1][1], reverse=True)
+
+        timing_rows = [
+            [name, format_labels(labels), int(calls), f"{total * 1000:.2f}", f"{total / calls * 1000:.2f}", f"{slowest * 1000:.2f}"]
+            for (name, labels), (calls, total, slowest) in timings
+        ]
+        counter_rows = [
+            [name, format_labels(labels), int(value) if value == int(value) else value]
+            for (name, labels), value in counters
+        ]
+
+        return "\n\n".join([
+            tabulate(timing_rows, headers=["Phase", "Labels", "Calls", "Total ms", "Mean ms", "Max ms"]),
+            tabulate(counter_rows, headers=["Counter", "Labels", "Value"]),
+        ])
+
+
+metrics = Metrics()
@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+
+
+# Only used at the edges (display and serialisation). Scoring itself works
+# on ScoreVector so it never has to import or validate these.
+class RankItem(BaseModel):
+    name: str
+    possible_points: int
+    points: int = 0
+    completed: bool = False
+
+    def to_list(self):
+        return [
+            self.name,
+            "✅" if self.completed else "❌",
+            self.points,
+            self.possible_points
+        ]
+    
+    def complete(self):
+        self.completed = True
+        self.points = self.possible_points
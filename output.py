@@ -0,0 +1,96 @@
+# Machine readable results for other tools to consume. Every player is
+# written as soon as they're scored, straight from their ScoreVector, so
+# nothing waits on the whole clan and no RankItem rows get built. The
+# tabulate tables in clan_rank are only for people reading a terminal.
+#
+# Players streamed out of a clan run don't have a percentile yet, that needs
+# everyone's points.
+import csv
+from collections.abc import Iterable
+from typing import TextIO
+
+from cache import dumps
+from clan_rank import CRITERIA, RankResult
+from metrics import metrics
+
+# Per-player columns in front of one points column per criterion key
+CSV_COLUMNS = ["username", "clan_points", "rank", "next_rank", "points_to_next_rank", "percentile"]
+
+
+class JsonWriter():
+    # A single array, elements written as they come in
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self.written = 0
+
+    def write(self, result: RankResult):
+        self.stream.write("[\n" if self.written == 0 else ",\n")
+        self.stream.write(dumps(result.to_dict()).decode())
+        self.stream.flush()
+        self.written += 1
+
+    def close(self):
+        self.stream.write("[]\n" if self.written == 0 else "\n]\n")
+        self.stream.flush()
+
+
+class NdjsonWriter():
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+
+    def write(self, result: RankResult):
+        self.stream.write(dumps(result.to_dict()).decode() + "\n")
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class CsvWriter():
+    # Points only. Names, categories and possible points are the same for
+    # every player and would only repeat on each row.
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.writer.writerow(CSV_COLUMNS + [criterion.key for criterion in CRITERIA])
+
+    def write(self, result: RankResult):
+        self.writer.writerow([
+            result.username,
+            result.clan_points,
+            result.rank,
+            result.next_rank,
+            result.points_to_next_rank,
+            result.percentile,
+            *result.scores.points,
+        ])
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+WRITERS = {
+    "json": JsonWriter,
+    "ndjson": NdjsonWriter,
+    "csv": CsvWriter,
+}
+
+
+def stream_results(results: Iterable[RankResult | None], output_format: str, stream: TextIO) -> list[RankResult]:
+    # Writes each result the moment it comes out of `results` and hands back
+    # the ones that were scored, skipping players that couldn't be
+    writer = WRITERS[output_format](stream)
+    scored = []
+
+    for result in results:
+        if result is None:
+            continue
+
+        with metrics.timer("render_seconds", view=output_format):
+            writer.write(result)
+
+        scored.append(result)
+
+    writer.close()
+    return scored
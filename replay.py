@@ -0,0 +1,261 @@
+# Scores the clan as it was at some point in the past from captured payloads,
+# without the network or the response cache. An archive is a directory of
+# captures named by when they were taken, each laid out like the benchmark
+# fixtures:
+#
+#   ARCHIVE/20261001T060000Z/group.json
+#   ARCHIVE/20261001T060000Z/runeprofile/<username>.json
+#   ARCHIVE/20261001T060000Z/wom/<username>.json
+#   ARCHIVE/20261001T060000Z/manifest.json
+#
+# or that same tree packed into one tar file, compressed or not. Captures can
+# be partial, every player is scored from the newest payload taken at or
+# before the chosen time. Bundles are streamed, so only the payloads for that
+# one point in time are ever held in memory, not every capture in the file.
+import json
+import logging
+import os
+import tarfile
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from typing import Callable
+from urllib.parse import unquote
+
+from cache import CachedResponse, normalize_username
+from clan_rank import CLAN_GROUP_ID, Profile, RankResult, cache
+from members import MembershipIndex
+from metrics import metrics
+
+logger = logging.getLogger('ClanRank')
+
+SOURCES = ("runeprofile", "wom")
+# Key the group payload is filed under alongside the player ones
+GROUP = ("group", "")
+# Compact ISO 8601, no colons so it's a valid file name everywhere
+CAPTURE_FORMAT = "%Y%m%dT%H%M%SZ"
+# When each payload in a capture was really fetched, not read by replays
+MANIFEST = "manifest.json"
+
+
+def parse_time(text: str) -> datetime | None:
+    try:
+        when = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+    # Captures are taken in UTC, same as everything WOM sends
+    return when if when.tzinfo else when.replace(tzinfo=UTC)
+
+
+def entry_key(parts: list[str]) -> tuple[str, str] | None:
+    # Path inside a capture -> (source, normalised username), None for anything else
+    if parts == ["group.json"]:
+        return GROUP
+
+    if len(parts) == 2 and parts[0] in SOURCES and parts[1].endswith('.json'):
+        # Names can be written as is or quoted like the cache does it
+        return parts[0], normalize_username(unquote(parts[1].removesuffix('.json')))
+
+    return None
+
+
+def read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@dataclass(slots=True)
+class Snapshot():
+    # When the group was captured
+    captured_at: datetime
+    group: bytes
+    # (source, normalised username) -> location of the newest body, read on demand
+    payloads: dict[tuple[str, str], object]
+    read: Callable[[object], bytes]
+
+    def response(self, source: str, username: str) -> CachedResponse | None:
+        location = self.payloads.get((source, normalize_username(username)))
+        return None if location is None else CachedResponse.from_body(self.read(location))
+
+
+def latest(entries, at: datetime | None) -> tuple[dict, dict]:
+    # (capture time, path parts, location) -> newest location and its capture
+    # time for every key, ignoring captures after `at`
+    locations = {}
+    taken = {}
+
+    for when, parts, location in entries:
+        if when is None or (at is not None and when > at):
+            continue
+
+        key = entry_key(parts)
+
+        if key is not None and when >= taken.get(key, when):
+            locations[key] = location
+            taken[key] = when
+
+    return locations, taken
+
+
+class DirectoryArchive():
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def entries(self):
+        # Only lists files, nothing is read until a player is scored
+        for name in os.listdir(self.path):
+            capture = os.path.join(self.path, name)
+            when = parse_time(name)
+
+            if when is None or not os.path.isdir(capture):
+                continue
+
+            for root, _, files in os.walk(capture):
+                relative = os.path.relpath(root, capture)
+                parts = [] if relative == '.' else relative.split(os.sep)
+
+                for file in files:
+                    yield when, parts + [file], os.path.join(root, file)
+
+    def snapshot(self, at: datetime | None = None) -> Snapshot:
+        locations, taken = latest(self.entries(), at)
+        return make_snapshot(self.path, locations, taken, at, read_file)
+
+
+class BundleArchive():
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def snapshot(self, at: datetime | None = None) -> Snapshot:
+        # One pass over the stream. Bodies are only read for captures that
+        # are newer than what's already been kept, and older ones dropped.
+        bodies = {}
+        taken = {}
+
+        with tarfile.open(self.path, mode='r|*') as bundle:
+            for member in bundle:
+                if not member.isfile():
+                    continue
+
+                parts = member.name.removeprefix('./').split('/')
+                when = parse_time(parts[0])
+                key = entry_key(parts[1:])
+
+                if when is None or key is None or (at is not None and when > at) or when < taken.get(key, when):
+                    continue
+
+                bodies[key] = bundle.extractfile(member).read()
+                taken[key] = when
+
+        # Already in memory
+        return make_snapshot(self.path, bodies, taken, at, bytes)
+
+
+def make_snapshot(path: str, locations: dict, taken: dict, at: datetime | None, read) -> Snapshot:
+    if GROUP not in locations:
+        when = f"at or before {at.isoformat()}" if at else "at all"
+        raise LookupError(f"{path} has no group capture {when}")
+
+    return Snapshot(taken[GROUP], read(locations.pop(GROUP)), locations, read)
+
+
+def open_archive(path: str) -> DirectoryArchive | BundleArchive:
+    return DirectoryArchive(path) if os.path.isdir(path) else BundleArchive(path)
+
+
+def replay_member(snapshot: Snapshot, username: str, members: MembershipIndex, as_of: datetime) -> RankResult | None:
+    rp_response = snapshot.response("runeprofile", username)
+    wom_response = snapshot.response("wom", username)
+
+    if rp_response is None or wom_response is None:
+        logger.warning(f"Skipping {username}: no RuneProfile and Wise Old Man capture as of {as_of.isoformat()}")
+        return None
+
+    try:
+        profile = Profile.from_responses(username, rp_response, wom_response, members=members, as_of=as_of)
+        profile.set_item_data()
+    except Exception:
+        logger.exception(f"Failed to score {username}")
+        return None
+
+    return profile.result()
+
+
+def replay_members(
+    path: str,
+    at: datetime | None = None,
+    vector: bool = False,
+) -> tuple[datetime, Iterable[RankResult | None]]:
+    # (time scored as of, each member's result in clan order). Without `at`
+    # it's the newest capture. The snapshot is loaded up front, players are
+    # only scored as the results are consumed, or all at once over arrays
+    # with `vector`.
+    with metrics.timer("replay_load_seconds"):
+        snapshot = open_archive(path).snapshot(at)
+
+    as_of = at or snapshot.captured_at
+    members = MembershipIndex.from_group(CachedResponse.from_body(snapshot.group).data)
+
+    if vector:
+        return as_of, replay_vector(snapshot, members, as_of)
+
+    return as_of, (replay_member(snapshot, username, members, as_of) for username in members.usernames())
+
+
+def replay_vector(snapshot: Snapshot, members: MembershipIndex, as_of: datetime) -> list[RankResult | None]:
+    from vector import score_players
+
+    players = []
+
+    for username in members.usernames():
+        rp_response = snapshot.response("runeprofile", username)
+        wom_response = snapshot.response("wom", username)
+
+        if rp_response is None or wom_response is None:
+            logger.warning(f"Skipping {username}: no RuneProfile and Wise Old Man capture as of {as_of.isoformat()}")
+
+        players.append((username, rp_response, wom_response))
+
+    return score_players(players, members, as_of)
+
+
+def capture(archive: str, usernames: Iterable[str], now: datetime | None = None) -> str:
+    # Copies the payloads the given members were just scored from out of the
+    # response cache, nobody else's (ex members, players that failed), into
+    # one capture stamped with the time of the run. Replays take the whole
+    # capture as of that time, so a member is never missed for being fetched
+    # a few seconds after the group. When each payload was fetched or last
+    # revalidated goes in the manifest, so one reused from the cache can
+    # still be told apart. The bodies are the projected ones, which is
+    # everything scoring needs. Returns the capture's directory.
+    now = now or datetime.now(UTC)
+    target = os.path.join(archive, now.strftime(CAPTURE_FORMAT))
+    fetched_at = {}
+
+    def copy(source: str, key: str, name: str):
+        entry = cache.load(source, key)
+
+        if entry is None:
+            return
+
+        path = os.path.join(target, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'wb') as f:
+            f.write(entry.body)
+
+        fetched_at[name.replace(os.sep, '/')] = datetime.fromtimestamp(entry.fetched_at, UTC).isoformat()
+
+    copy("group", str(CLAN_GROUP_ID), "group.json")
+
+    for username in usernames:
+        for source in SOURCES:
+            copy(source, username, os.path.join(source, os.path.basename(cache.path(source, username))))
+
+    os.makedirs(target, exist_ok=True)
+
+    with open(os.path.join(target, MANIFEST), 'w') as f:
+        json.dump({"captured_at": now.isoformat(), "fetched_at": fetched_at}, f, indent=2)
+
+    return target
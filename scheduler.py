@@ -0,0 +1,225 @@
+# Keeps the clan's scores fresh without refetching everyone on a loop.
+# Each member gets a refresh interval from how recently their account last
+# changed: someone who played an hour ago is looked at again as soon as
+# their cached payloads expire, someone who hasn't logged in for months
+# only every few days. Members sit in a heap ordered by when they're next
+# due (last refresh + interval), the moment staleness / interval reaches 1,
+# so finding who's due never looks at anyone else. When more are due than
+# the API rate limits allow in a tick (a cold start, a restart after
+# downtime), the ones with the highest staleness / interval go first, so the
+# most active accounts are never stuck behind idle ones that happened to
+# fall due earlier. The rest stay queued for the next tick. The schedule is
+# saved in the response cache (pinned, so eviction never drops it) so a
+# restart carries on where it left off.
+import heapq
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import clan_rank
+from cache import CachedResponse
+from clan_rank import CLAN_GROUP_ID, Profile, RankResult, cache, fetch_clan, fetcher, index_members
+from members import MembershipIndex
+from metrics import metrics
+
+logger = logging.getLogger('ClanRank')
+
+DEFAULT_TICK = 60
+# Nothing is refreshed more often than its payloads stay cached, a fresh
+# cache entry would just be handed straight back
+MIN_INTERVAL = min(cache.ttls["runeprofile"], cache.ttls["wom"])
+MAX_INTERVAL = 7 * 24 * 60 * 60
+# Seconds between refreshes per second since the account last changed, so a
+# week idle is looked at about every 17 hours
+IDLE_FACTOR = 0.1
+
+
+def parse_timestamp(value: str | None) -> float | None:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def refresh_interval(changed_at: float | None, now: float, min_interval: float = MIN_INTERVAL) -> float:
+    # Never seen to change means nothing to go on, treat it as long idle
+    if changed_at is None:
+        return MAX_INTERVAL
+
+    return min(max((now - changed_at) * IDLE_FACTOR, min_interval), MAX_INTERVAL)
+
+
+class RefreshScheduler():
+    def __init__(self, tick: float = DEFAULT_TICK, workers: int = 8) -> None:
+        self.tick = tick
+        self.workers = workers
+        # Payloads can be fetched up to a tick after the round started, and
+        # have to have expired by the time they're next due
+        self.min_interval = MIN_INTERVAL + tick
+        # Player id -> {"refreshed_at", "changed_at", "due_at", "digests"}
+        self.state: dict[int, dict] = {}
+        # (due_at, player id). Entries go stale when a member is refreshed or
+        # leaves and are skipped when they come up, not searched for.
+        self._queue: list[tuple[float, int]] = []
+
+    def load(self):
+        stored = cache.load("schedule", str(CLAN_GROUP_ID))
+        self.state = {int(player_id): entry for player_id, entry in stored.data.items()} if stored else {}
+        self._rebuild()
+
+    def save(self):
+        cache.set("schedule", str(CLAN_GROUP_ID), {str(player_id): entry for player_id, entry in self.state.items()})
+
+    def _rebuild(self):
+        self._queue = [(entry['due_at'], player_id) for player_id, entry in self.state.items()]
+        heapq.heapify(self._queue)
+
+    def budget(self) -> int | None:
+        # Players per tick. Each one costs a request to both APIs, so the
+        # slower of the two limits how many fit. None when neither host is
+        # paced, then everyone due is refreshed. The URLs are looked up now
+        # rather than at import, they can be pointed elsewhere (bench/suite.py).
+        limits = [
+            fetcher.rate_limits[host]
+            for host in (urlsplit(clan_rank.WOM_URL).netloc, urlsplit(clan_rank.RUNEPROFILE_URL).netloc)
+            if math.isfinite(fetcher.rate_limits.get(host, math.inf))
+        ]
+
+        if not limits:
+            return None
+
+        return max(int(min(limits) * self.tick / 60), 1)
+
+    def sync(self, members: MembershipIndex, group: CachedResponse, now: float):
+        # New members are due straight away, departed ones are dropped. WOM's
+        # own idea of when each account last changed comes free with the
+        # group, and anyone who has changed since is brought forward.
+        changed = {
+            member['player']['id']: parse_timestamp(member['player'].get('lastChangedAt'))
+            for member in group.data['memberships']
+        }
+        rebuild = False
+
+        for player_id in members.joined:
+            entry = self.state.get(player_id)
+
+            if entry is None:
+                self.state[player_id] = {"refreshed_at": None, "changed_at": changed.get(player_id), "due_at": now, "digests": None}
+                heapq.heappush(self._queue, (now, player_id))
+            elif (changed.get(player_id) or 0) > (entry['changed_at'] or 0):
+                entry['changed_at'] = changed[player_id]
+                due_at = (entry['refreshed_at'] or now) + refresh_interval(entry['changed_at'], now, self.min_interval)
+
+                if due_at < entry['due_at']:
+                    # The old heap entry no longer matches and is skipped
+                    entry['due_at'] = due_at
+                    heapq.heappush(self._queue, (due_at, player_id))
+
+        for player_id in set(self.state) - set(members.joined):
+            del self.state[player_id]
+            rebuild = True
+
+        if rebuild:
+            self._rebuild()
+
+    def priority(self, entry: dict, now: float) -> float:
+        # Staleness / interval. Members never refreshed count as a full
+        # MAX_INTERVAL stale, so on a cold start the group's lastChangedAt
+        # still puts the active ones first.
+        stale = now - entry['refreshed_at'] if entry['refreshed_at'] is not None else MAX_INTERVAL
+        return stale / refresh_interval(entry['changed_at'], now, self.min_interval)
+
+    def due(self, now: float, limit: int | None = None) -> list[int]:
+        # Most overdue relative to how active they are first, at most `limit`
+        # of them. Anyone due who doesn't fit goes back on the heap.
+        due = {}
+
+        while self._queue and self._queue[0][0] <= now:
+            due_at, player_id = heapq.heappop(self._queue)
+            entry = self.state.get(player_id)
+
+            if entry is not None and entry['due_at'] == due_at:
+                due[player_id] = entry
+
+        player_ids = sorted(due, key=lambda player_id: self.priority(due[player_id], now), reverse=True)
+
+        for player_id in player_ids[limit:] if limit is not None else ():
+            heapq.heappush(self._queue, (due[player_id]['due_at'], player_id))
+
+        return player_ids[:limit]
+
+    def next_due(self) -> float | None:
+        return self._queue[0][0] if self._queue else None
+
+    def refresh(self, player_id: int, members: MembershipIndex, now: float) -> RankResult | None:
+        username = members.display_names[player_id]
+        entry = self.state[player_id]
+        result = None
+
+        try:
+            profile = Profile(username, members=members)
+            profile.set_item_data()
+        except Exception as e:
+            # Try again after the usual interval rather than hammering it
+            logger.warning(f"Failed to refresh {username}: {e}")
+            metrics.count("refreshes", result="failed")
+        else:
+            result = profile.result()
+            digests = [profile.rp_response.digest, profile.wom_response.digest]
+            changed = parse_timestamp(profile.wom_data.get('lastChangedAt'))
+
+            if entry['digests'] is not None and digests != entry['digests']:
+                changed = max(changed or 0, now)
+
+            if changed is not None and changed > (entry['changed_at'] or 0):
+                entry['changed_at'] = changed
+
+            if entry['digests'] is None:
+                metrics.count("refreshes", result="first")
+            else:
+                metrics.count("refreshes", result="changed" if digests != entry['digests'] else "unchanged")
+
+            entry['digests'] = digests
+
+        entry['refreshed_at'] = now
+        entry['due_at'] = now + refresh_interval(entry['changed_at'], now, self.min_interval)
+
+        return result
+
+    def run_once(self, now: float | None = None) -> list[RankResult]:
+        now = now or time.time()
+        group = cache.get_or_fetch("group", str(CLAN_GROUP_ID), fetch_clan)
+        members = index_members(group)
+        self.sync(members, group, now)
+
+        player_ids = self.due(now, self.budget())
+
+        # The fetcher's rate limiters still pace the requests within the tick
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda player_id: self.refresh(player_id, members, now), player_ids))
+
+        for player_id in player_ids:
+            heapq.heappush(self._queue, (self.state[player_id]['due_at'], player_id))
+
+        self.save()
+
+        next_due = self.next_due()
+        waiting = f", next due in {max(next_due - time.time(), 0):.0f}s" if next_due is not None else ""
+        logger.info(f"Refreshed {len(player_ids)} of {len(self.state)} members{waiting}")
+
+        return [result for result in results if result is not None]
+
+    def run(self, stop: threading.Event | None = None, on_results=None):
+        # Until stop is set. on_results gets each tick's refreshed results.
+        stop = stop or threading.Event()
+        self.load()
+
+        while not stop.is_set():
+            started = time.monotonic()
+            results = self.run_once()
+
+            if on_results is not None and results:
+                on_results(results)
+
+            stop.wait(max(self.tick - (time.monotonic() - started), 0))
@@ -0,0 +1,244 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from cache import normalize_username
+from clan_rank import PlayerNotFound, RankResult, iter_clan, rank_clan, score_player
+from leaderboard import Leaderboard
+from metrics import metrics
+
+logger = logging.getLogger('ClanRank')
+
+DEFAULT_PORT = 8169
+DEFAULT_RESULT_TTL = 5 * 60
+DEFAULT_MAX_RESULTS = 2048
+# Seconds a client is told to wait while the first clan pass runs
+CLAN_RETRY_AFTER = 30
+
+
+class ResultCache():
+    # In-memory TTL + LRU cache of already serialised responses. Concurrent
+    # misses for the same key share one computation instead of each going
+    # upstream.
+    def __init__(self, max_entries: int = DEFAULT_MAX_RESULTS, ttl: float = DEFAULT_RESULT_TTL) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._in_flight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: str, compute) -> bytes:
+        value = self.get(key)
+
+        if value is not None:
+            return value
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+        return value
+
+
+def encode(data) -> bytes:
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+class RankService():
+    def __init__(self, results: ResultCache | None = None, workers: int = 8) -> None:
+        self.results = results or ResultCache()
+        self.workers = workers
+
+        # Bodies from the last clan pass, kept past their TTL so there's
+        # always something to serve while the next pass runs
+        self._clan: dict[str, bytes] | None = None
+        self._clan_scored_at = 0.0
+        self._clan_pass: threading.Thread | None = None
+        self._clan_lock = threading.Lock()
+
+    def rank(self, username: str) -> bytes:
+        return self.results.get_or_compute(
+            f"rank:{normalize_username(username)}",
+            lambda: encode(score_player(username).to_dict()),
+        )
+
+    def leaderboard(self) -> tuple[bytes | None, float]:
+        return self.clan("leaderboard")
+
+    def stats(self) -> tuple[bytes | None, float]:
+        return self.clan("stats")
+
+    def clan(self, name: str) -> tuple[bytes | None, float]:
+        # (body, seconds since it was scored). A clan pass can take as long as
+        # the API budgets need to get through every member, so no request
+        # ever waits on one: a missing or expired result starts a pass in the
+        # background and whatever there is gets served meanwhile, None before
+        # the first pass is done.
+        with self._clan_lock:
+            age = time.monotonic() - self._clan_scored_at
+
+            if (self._clan is None or age > self.results.ttl) and self._clan_pass is None:
+                self._clan_pass = threading.Thread(target=self._refresh_clan, name="clan-pass", daemon=True)
+                self._clan_pass.start()
+
+            return (self._clan[name], age) if self._clan is not None else (None, 0.0)
+
+    def _refresh_clan(self):
+        try:
+            bodies = self._score_clan()
+        except Exception:
+            # Left as it was, the next request tries again
+            logger.exception("Clan pass failed")
+            bodies = None
+
+        with self._clan_lock:
+            if bodies is not None:
+                self._clan = bodies
+                self._clan_scored_at = time.monotonic()
+
+            self._clan_pass = None
+
+    def _score_clan(self) -> dict[str, bytes]:
+        # One pass builds both, the stats are tallied as the results come in
+        board = Leaderboard()
+        results = rank_clan(list(board.tally(iter_clan(workers=self.workers))))
+
+        # A clan pass scores everyone anyway, so warm the per-player entries too
+        for result in results:
+            self.results.put(f"rank:{normalize_username(result.username)}", encode(result.to_dict()))
+
+        return {
+            "leaderboard": encode([
+                leaderboard_row(position, result)
+                for position, result in enumerate(results, start=1)
+            ]),
+            "stats": encode(board.to_dict()),
+        }
+
+
+def leaderboard_row(position: int, result: RankResult) -> dict:
+    return {
+        "position": position,
+        "username": result.username,
+        "rank": result.rank,
+        "clan_points": result.clan_points,
+    }
+
+
+class RankRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes, don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+    service: RankService
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path).rstrip('/')
+
+        try:
+            if path.startswith('/rank/') and len(path) > len('/rank/'):
+                body = self.service.rank(path[len('/rank/'):])
+            elif path in ('/clan/leaderboard', '/clan/stats'):
+                return self.send_clan(self.service.clan(path[len('/clan/'):]))
+            elif path == '/metrics':
+                return self.send_body(200, metrics.to_prometheus().encode(), 'text/plain; version=0.0.4')
+            else:
+                return self.send_json(404, encode({"error": "Not found"}))
+        except PlayerNotFound as e:
+            return self.send_json(404, encode({"error": str(e)}))
+        except Exception:
+            # The details can include upstream URLs, they only go in the log
+            logger.exception(f"Failed to serve {self.path}")
+            return self.send_json(502, encode({"error": "upstream fetch failed"}))
+
+        self.send_json(200, body)
+
+    def send_clan(self, clan: tuple[bytes | None, float]):
+        body, age = clan
+
+        if body is None:
+            return self.send_json(
+                202,
+                encode({"status": "The clan is being scored, try again shortly"}),
+                {'Retry-After': str(CLAN_RETRY_AFTER)},
+            )
+
+        # Age tells clients how old a possibly stale leaderboard is
+        self.send_json(200, body, {'Age': str(int(age))})
+
+    def send_json(self, status: int, body: bytes, headers: dict[str, str] | None = None):
+        self.send_body(status, body, 'application/json', headers)
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: dict[str, str] | None = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def serve(host: str = "127.0.0.1", port: int = DEFAULT_PORT, service: RankService | None = None):
+    handler = type('Handler', (RankRequestHandler,), {"service": service or RankService()})
+    server = ThreadingHTTPServer((host, port), handler)
+
+    logger.info(f"Serving ranks on http://{host}:{port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,301 @@
+# Answers "what's the quickest way to rank X" for a scored player without
+# rescoring anything. Every unmet criterion is worth a known number of extra
+# points, so the question is which fewest goals add up to the points still
+# needed: a small subset-sum search, pruned with prefix sums over the goals
+# sorted by value.
+#
+# Criteria that read the same stat aren't independent. 2277 total level is
+# also every lower total level threshold, and a Grandmaster combat
+# achievement tier is Master and everything below it plus the combat
+# achievement points that takes. So criteria are grouped by stat, each
+# option in a group is one level reached with everything it implies, and a
+# path takes at most one option from each group.
+import heapq
+from dataclasses import dataclass, field
+
+from clan_rank import CRITERIA, RankResult, ladder
+
+DEFAULT_LIMIT = 5
+# Search nodes visited before giving up on finding more paths
+DEFAULT_BUDGET = 20_000
+# Tier stats and the capped stat their tiers are counted from
+TIER_STATS = {
+    "combat_achievement_tiers": "combat_achievement_points",
+    "diary_tiers": "diary_tasks",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Step():
+    key: str
+    name: str
+    points: int
+    # Capped criteria (EHB, collection log, ...) can be done part way, this is
+    # how many of their remaining points the path actually needs
+    partial: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class Option():
+    # One level of a group with everything it implies, at full value. The
+    # capped step can give back up to `slack` of it when less is needed.
+    steps: tuple[Step, ...]
+    slack: int = 0
+
+    @property
+    def points(self) -> int:
+        return sum(step.points for step in self.steps)
+
+
+@dataclass(slots=True)
+class Path():
+    steps: list[Step] = field(default_factory=list)
+
+    @property
+    def points(self) -> int:
+        return sum(step.points for step in self.steps)
+
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{step.name} (+{step.points}{' partial' if step.partial else ''})"
+            for step in self.steps
+        )
+
+
+def step(result: RankResult, index: int) -> Step:
+    criterion = CRITERIA[index]
+    return Step(criterion.key, criterion.name, result.scores.possible_points[index] - result.scores.points[index])
+
+
+def group_options(result: RankResult, levels: list[int], capped: int | None) -> list[Option]:
+    # levels are the unmet threshold or tier criteria on one stat, capped the
+    # criterion that scores the stat itself. Reaching a level means every
+    # lower one too, and at least as much of the capped stat as the level
+    # needs. Beyond that the capped criterion is there to be done part way.
+    scores = result.scores
+    options = []
+    capped_step = None if capped is None else step(result, capped)
+    requirements = result.tier_requirements or {}
+
+    if capped_step is not None and capped_step.points > 0:
+        options.append(Option((capped_step,), capped_step.points - 1))
+
+    for position, index in enumerate(levels):
+        criterion = CRITERIA[index]
+        steps = tuple(step(result, lower) for lower in levels[:position + 1])
+
+        if capped_step is None or capped_step.points == 0:
+            options.append(Option(steps))
+            continue
+
+        if criterion.rule == "threshold":
+            required = criterion.value
+        else:
+            tiers = requirements.get(criterion.stat, [])
+
+            # Without knowing what the tier needs there's no telling how much
+            # of the capped stat comes with it, so it isn't offered at all
+            if criterion.tier >= len(tiers):
+                break
+
+            required = tiers[criterion.tier]
+
+        implied = max(min(required, scores.possible_points[capped]) - scores.points[capped], 0)
+        options.append(Option(steps + (capped_step,), capped_step.points - implied))
+
+    return options
+
+
+def options(result: RankResult) -> list[list[Option]]:
+    # What can still be done, one list of options per group. Manual criteria
+    # are left out because scoring can't give them to anyone yet, and tenure
+    # because there's no getting there faster. Tiers are only offered when
+    # the result carries their requirements.
+    scores = result.scores
+    groups: dict[str, tuple[list[int], list[int]]] = {}
+    singles = []
+
+    for index, criterion in enumerate(CRITERIA):
+        if criterion.rule == "manual" or criterion.section == "tenure":
+            continue
+
+        if criterion.rule == "capped":
+            groups.setdefault(criterion.stat, ([], []))[1].append(index)
+        elif criterion.rule in ("threshold", "tier"):
+            if scores.points[index] < scores.possible_points[index]:
+                groups.setdefault(TIER_STATS.get(criterion.stat, criterion.stat), ([], []))[0].append(index)
+        elif scores.points[index] < scores.possible_points[index]:
+            singles.append([Option((step(result, index),))])
+
+    grouped = []
+
+    for levels, capped in groups.values():
+        levels.sort(key=lambda index: (CRITERIA[index].value, CRITERIA[index].tier))
+        grouped.append(group_options(result, levels, capped[0] if capped else None))
+
+    return [group for group in grouped + singles if group]
+
+
+def tenure_points(result: RankResult) -> int:
+    # Points only more time in the clan can give
+    return sum(
+        result.scores.possible_points[index] - result.scores.points[index]
+        for index, criterion in enumerate(CRITERIA)
+        if criterion.section == "tenure"
+    )
+
+
+def points_needed(result: RankResult, target: str | None = None) -> tuple[str | None, int]:
+    if target is None:
+        return result.next_rank, result.points_to_next_rank or 0
+
+    if target not in ladder.positions:
+        raise ValueError(f"Unknown rank {target!r}, expected one of {', '.join(ladder.names)}")
+
+    return target, max(ladder.thresholds[ladder.positions[target]] - result.clan_points, 0)
+
+
+def to_path(chosen: list[Option], needed: int) -> Path:
+    # Use up full criteria first and let capped ones soak up any overshoot
+    overshoot = sum(option.points for option in chosen) - needed
+    steps = []
+
+    for option in chosen:
+        for index, option_step in enumerate(option.steps):
+            # The capped step is always the last one
+            if index == len(option.steps) - 1 and option.slack and overshoot > 0:
+                trimmed = min(overshoot, option.slack)
+                overshoot -= trimmed
+
+                if trimmed == option_step.points:
+                    continue
+
+                option_step = Step(option_step.key, option_step.name, option_step.points - trimmed, trimmed > 0)
+
+            steps.append(option_step)
+
+    return Path(steps)
+
+
+def search(
+    groups: list[list[Option]],
+    needed: int,
+    limit: int = DEFAULT_LIMIT,
+    budget: int = DEFAULT_BUDGET,
+) -> list[Path]:
+    if needed <= 0:
+        return [Path()]
+
+    if sum(max(option.points for option in group) for group in groups) < needed:
+        return []
+
+    available = sorted(
+        ((option.points, group, option) for group, group_options in enumerate(groups) for option in group_options),
+        key=lambda entry: entry[0],
+        reverse=True,
+    )
+    values = [value for value, _, _ in available]
+    prefix = [0]
+
+    for value in values:
+        prefix.append(prefix[-1] + value)
+
+    # The fewest goals that can possibly do it is however many of the most
+    # valuable ones it takes, more when those share a group. Look from there
+    # until something is found, and one more for alternatives.
+    fewest = next(size for size, total in enumerate(prefix) if total >= needed)
+    found = []
+    visited = 0
+    first = None
+
+    for size in range(fewest, len(groups) + 1):
+        if (first is not None and size > first + 1) or visited > budget:
+            break
+
+        candidates = []
+
+        def extend(start: int, chosen: list[int], taken: set[int], total: int, soak: int):
+            nonlocal visited
+
+            picks = size - len(chosen)
+
+            if picks == 0:
+                candidates.append((max(total - needed - soak, 0), tuple(chosen)))
+                return
+
+            for i in range(start, len(values) - picks + 1):
+                visited += 1
+
+                # Sorted by value, so if the best case from here falls short
+                # every later start does too. Ignoring groups only makes the
+                # best case higher, never lower.
+                if visited > budget or total + prefix[i + picks] - prefix[i] < needed:
+                    break
+
+                _, group, option = available[i]
+
+                # Already there before the last pick, a smaller set covers it
+                if group not in taken and (picks == 1 or total + values[i] < needed):
+                    chosen.append(i)
+                    taken.add(group)
+                    extend(i + 1, chosen, taken, total + values[i], soak + option.slack)
+                    taken.discard(group)
+                    chosen.pop()
+
+        extend(0, [], set(), 0, 0)
+
+        if candidates and first is None:
+            first = size
+
+        # Only the closest few are turned into paths, there can be thousands
+        found += [
+            (size, overshoot, to_path([available[i][2] for i in chosen], needed))
+            for overshoot, chosen in heapq.nsmallest(limit, candidates)
+        ]
+
+        if len(found) >= limit:
+            break
+
+    # Paths with a capped criterion have no real overshoot, rank them by how
+    # many goals they take and then by how close they land on the target
+    found.sort(key=lambda entry: (entry[0], entry[1]))
+    return [path for _, _, path in found[:limit]]
+
+
+def simulate(
+    result: RankResult,
+    target: str | None = None,
+    limit: int = DEFAULT_LIMIT,
+) -> tuple[str | None, int, list[Path]]:
+    # (target rank, points needed, fewest-goal paths to it)
+    target, needed = points_needed(result, target)
+
+    if target is None:
+        return None, 0, []
+
+    return target, needed, search(options(result), needed, limit)
+
+
+def print_simulation(result: RankResult, target: str | None = None, limit: int = DEFAULT_LIMIT):
+    target, needed, paths = simulate(result, target, limit)
+
+    if target is None:
+        print(f"{result.username} is already at the top rank")
+        return
+
+    if needed == 0:
+        print(f"{result.username} already has enough points for {target}")
+        return
+
+    print(f"Quickest ways to {target} ({needed} pts to go):")
+
+    if not paths:
+        reachable = sum(max(option.points for option in group) for group in options(result))
+
+        if reachable + tenure_points(result) >= needed:
+            print(f"  None, {target} is only reachable with more time in the clan")
+        else:
+            print(f"  None, {target} can't be reached with criteria that can be scored yet")
+
+    for position, path in enumerate(paths, start=1):
+        print(f"  {position}. {path}")
@@ -0,0 +1,34 @@
+import pytest
+
+import fixtures
+from cache import CachedResponse, dumps
+from clan_rank import cache, project_runeprofile, project_wom
+
+
+@pytest.fixture(autouse=True)
+def no_cache():
+    # Scores would otherwise be restored from, and saved to, the real cache
+    enabled = cache.enabled
+    cache.enabled = False
+    yield
+    cache.enabled = enabled
+
+
+@pytest.fixture
+def scratch_cache(tmp_path):
+    # For tests that need a cache, one that's thrown away afterwards
+    directory, enabled = cache.directory, cache.enabled
+    cache.directory, cache.enabled = str(tmp_path), True
+    yield
+    cache.directory, cache.enabled = directory, enabled
+
+
+def responses(username: str, rp_data: dict | None = None, wom_data: dict | None = None) -> tuple[CachedResponse, CachedResponse]:
+    # Projected like fetched payloads, from the fixture generator unless given
+    rp_data = fixtures.runeprofile(username) if rp_data is None else rp_data
+    wom_data = fixtures.wom(username) if wom_data is None else wom_data
+
+    return (
+        CachedResponse.from_body(dumps(project_runeprofile(rp_data))),
+        CachedResponse.from_body(dumps(project_wom(wom_data))),
+    )
@@ -0,0 +1,77 @@
+import sqlite3
+from datetime import datetime, timedelta, UTC
+
+import pytest
+
+from clan_rank import CRITERIA, RankResult, ScoreVector, ladder
+from history import SCHEMA_VERSION, HistoryStore
+
+FIRST = datetime(2026, 9, 1, tzinfo=UTC)
+SECOND = FIRST + timedelta(days=7)
+
+
+def result(player_id: int, username: str, points: dict[int, int]) -> RankResult:
+    # points: criterion index -> points, everything else on 0
+    scores = ScoreVector.empty([0] * len(CRITERIA))
+
+    for index, value in points.items():
+        scores.points[index] = value
+
+    rank, next_rank, points_to_next_rank = ladder.standing(scores.total)
+    return RankResult(username, scores.total, rank, next_rank, points_to_next_rank, scores, player_id=player_id)
+
+
+@pytest.fixture
+def store():
+    # Tim ranks up and renames between the runs, Ann stays where she is
+    last = len(CRITERIA) - 1
+    promotion = ladder.thresholds[1]
+    store = HistoryStore(':memory:')
+    store.record([result(1, "Typical Tim", {0: 10}), result(2, "Ann", {last: 5})], FIRST)
+    store.record([result(1, "Tim II", {0: 10, last: promotion}), result(2, "Ann", {last: 5})], SECOND)
+    yield store
+    store.close()
+
+
+def test_points_over_time(store):
+    promotion = ladder.thresholds[1]
+
+    assert store.points_over_time(1) == [(FIRST, 10), (SECOND, 10 + promotion)]
+    # By either name, and for one criterion
+    assert store.points_over_time("typical tim", CRITERIA[-1].key) == [(FIRST, 0), (SECOND, promotion)]
+    assert store.points_over_time("Tim II", start=SECOND) == [(SECOND, 10 + promotion)]
+    assert store.points_over_time(2, end=FIRST) == [(FIRST, 5)]
+
+
+def test_ranked_up_since(store):
+    assert store.ranked_up_since(FIRST) == [("Tim II", ladder.names[0], ladder.names[1])]
+    assert store.ranked_up_since(SECOND) == []
+
+
+def test_category_totals(store):
+    first, last = CRITERIA[0].category, CRITERIA[-1].category
+    promotion = ladder.thresholds[1]
+    before = store.category_totals(FIRST)
+    now = store.category_totals()
+
+    assert (before[first], before[last]) == (10, 5)
+    assert (now[first], now[last]) == (10, 5 + promotion)
+    assert set(now) == {criterion.category for criterion in CRITERIA}
+    assert sum(now.values()) == 15 + promotion
+
+
+def test_refuses_another_schema_version(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    HistoryStore(path).close()
+
+    with sqlite3.connect(path) as db:
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+
+    with pytest.raises(ValueError, match="schema version"):
+        HistoryStore(path)
+
+    # Reopening one of our own is fine
+    with sqlite3.connect(path) as db:
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    HistoryStore(path).close()
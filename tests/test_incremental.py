@@ -0,0 +1,55 @@
+import pytest
+
+import fixtures
+from clan_rank import Profile, cache
+from conftest import responses
+
+USERNAME = "Typical Tim"
+
+# Incremental scoring diffs against the score saved by the previous run
+pytestmark = pytest.mark.usefixtures("scratch_cache")
+
+
+def score(rp_data: dict, wom_data: dict):
+    profile = Profile.from_responses(USERNAME, *responses(USERNAME, rp_data, wom_data))
+    profile.set_item_data()
+    return profile.result()
+
+
+def finish_quest(rp_data: dict, wom_data: dict):
+    quest = next(quest for quest in rp_data['quests'] if quest['state'] != 2)
+    quest['state'] = 2
+
+
+def add_item(rp_data: dict, wom_data: dict):
+    owned = {item['name'] for item in rp_data['items']}
+    index, name = next((index, name) for index, name in enumerate(fixtures.CRITERIA_ITEMS) if name not in owned)
+    rp_data['items'].append({"id": index, "name": name, "quantity": 1})
+
+
+def finish_diary(rp_data: dict, wom_data: dict):
+    tier = next(tier for tier in rp_data['achievementDiaryTiers'] if tier['completedCount'] < tier['tasksCount'])
+    tier['completedCount'] = tier['tasksCount']
+
+
+def gain_ehb(rp_data: dict, wom_data: dict):
+    wom_data['ehb'] += 500
+
+
+@pytest.mark.parametrize("mutate", [finish_quest, add_item, finish_diary, gain_ehb])
+def test_incremental_matches_full_rescore(mutate):
+    rp_data, wom_data = fixtures.runeprofile(USERNAME), fixtures.wom(USERNAME)
+    before = score(rp_data, wom_data)
+
+    mutate(rp_data, wom_data)
+    incremental = score(rp_data, wom_data)
+
+    cache.enabled = False
+    full = score(rp_data, wom_data)
+
+    # Only an incremental rescore reports what changed
+    assert incremental.changes and not full.changes
+    assert incremental.scores.points != before.scores.points
+    assert incremental.scores.points == full.scores.points
+    assert incremental.scores.possible_points == full.scores.possible_points
+    assert (incremental.clan_points, incremental.rank) == (full.clan_points, full.rank)
@@ -0,0 +1,68 @@
+from datetime import datetime, UTC
+
+from cache import CachedResponse, dumps
+from members import MembershipIndex
+from scheduler import MAX_INTERVAL, RefreshScheduler
+
+NOW = datetime(2026, 10, 1, tzinfo=UTC).timestamp()
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+def group(changed: dict[int, float | None]) -> CachedResponse:
+    return CachedResponse.from_body(dumps({
+        "memberships": [
+            {
+                "createdAt": "2024-01-01T00:00:00+00:00",
+                "player": {
+                    "id": player_id,
+                    "displayName": f"Player {player_id}",
+                    "lastChangedAt": datetime.fromtimestamp(at, UTC).isoformat() if at is not None else None,
+                },
+            }
+            for player_id, at in changed.items()
+        ],
+    }))
+
+
+def synced(changed: dict[int, float | None]) -> RefreshScheduler:
+    scheduler = RefreshScheduler()
+    response = group(changed)
+    scheduler.sync(MembershipIndex.from_group(response.data), response, NOW)
+    return scheduler
+
+
+def test_cold_start_refreshes_the_most_active_first():
+    scheduler = synced({1: None, 2: NOW - 3 * DAY, 3: NOW - HOUR})
+
+    assert scheduler.due(NOW, limit=2) == [3, 2]
+    # Whoever didn't fit is still due next tick
+    assert scheduler.due(NOW) == [1]
+
+
+def test_backlog_prefers_active_over_earlier_due():
+    scheduler = synced({1: NOW - 90 * DAY, 2: NOW - 2 * DAY})
+
+    # 1 has been due for a day on a week's interval, 2 for an hour on a few hours'
+    for player_id, refreshed_at in ((1, NOW - MAX_INTERVAL - DAY), (2, NOW - 6 * HOUR)):
+        entry = scheduler.state[player_id]
+        entry['refreshed_at'] = refreshed_at
+        entry['due_at'] = NOW - (DAY if player_id == 1 else HOUR)
+
+    scheduler._rebuild()
+
+    assert scheduler.due(NOW, limit=1) == [2]
+    assert scheduler.due(NOW, limit=1) == [1]
+
+
+def test_activity_brings_an_idle_member_forward():
+    scheduler = synced({1: NOW - 90 * DAY})
+    entry = scheduler.state[1]
+    entry['refreshed_at'], entry['due_at'] = NOW, NOW + MAX_INTERVAL
+    scheduler._rebuild()
+
+    response = group({1: NOW + HOUR})
+    scheduler.sync(MembershipIndex.from_group(response.data), response, NOW + 2 * HOUR)
+
+    assert entry['due_at'] < NOW + DAY
+    assert scheduler.due(NOW + DAY) == [1]
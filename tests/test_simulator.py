@@ -0,0 +1,53 @@
+from dataclasses import replace
+from datetime import datetime, UTC
+
+import fixtures
+from clan_rank import Profile
+from conftest import responses
+from simulator import options, to_path
+
+AS_OF = datetime(2026, 10, 1, tzinfo=UTC)
+
+
+def master_result():
+    # Every combat achievement tier up to Master, nothing of Grandmaster
+    rp_data = fixtures.runeprofile("Typical Tim")
+
+    for tier in rp_data['combatAchievementTiers']:
+        tier['completedCount'] = tier['tasksCount'] if tier['id'] < 6 else 0
+
+    profile = Profile.from_responses("Typical Tim", *responses("Typical Tim", rp_data), as_of=AS_OF)
+    profile.set_item_data()
+    return profile.result()
+
+
+def combat_achievement_options(result):
+    return next(
+        group
+        for group in options(result)
+        if any(step.key == "combat_achievement_points" for option in group for step in option.steps)
+    )
+
+
+def test_grandmaster_needs_every_combat_achievement_point():
+    result = master_result()
+    group = combat_achievement_options(result)
+    grandmaster = next(
+        option
+        for option in group
+        if any(step.key == "grandmaster_combat_achievements" for step in option.steps)
+    )
+
+    # 55 Grandmaster tasks at 6 points each, none of which can be left out
+    assert grandmaster.slack == 0
+    assert [(step.key, step.points, step.partial) for step in to_path([grandmaster], 1).steps] == [
+        ("grandmaster_combat_achievements", 300, False),
+        ("combat_achievement_points", 330, False),
+    ]
+
+
+def test_no_tier_options_without_requirements():
+    result = replace(master_result(), tier_requirements=None)
+    group = combat_achievement_options(result)
+
+    assert [[step.key for step in option.steps] for option in group] == [["combat_achievement_points"]]
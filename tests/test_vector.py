@@ -0,0 +1,80 @@
+from datetime import datetime, UTC
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import fixtures
+from cache import CachedResponse, dumps
+from clan_rank import Profile
+from conftest import responses
+from members import MembershipIndex
+from vector import ClanArrays, score_players
+
+AS_OF = datetime(2026, 10, 1, tzinfo=UTC)
+
+
+def profile_results(players, members):
+    results = []
+
+    for username, rp_response, wom_response in players:
+        profile = Profile.from_responses(username, rp_response, wom_response, members=members, as_of=AS_OF)
+        profile.set_item_data()
+        results.append(profile.result())
+
+    return results
+
+
+def test_matches_profile_scoring():
+    members = MembershipIndex.from_group(fixtures.group(200))
+    players = [(username, *responses(username)) for username in members.usernames()]
+
+    expected = profile_results(players, members)
+    results = ClanArrays.from_responses(players, members, AS_OF).results()
+
+    assert [result.username for result in results] == [result.username for result in expected]
+
+    for result, profile in zip(results, expected):
+        assert result.scores.points == profile.scores.points, result.username
+        assert result.scores.possible_points == profile.scores.possible_points, result.username
+        assert (result.clan_points, result.rank, result.next_rank) == (profile.clan_points, profile.rank, profile.next_rank)
+        assert result.player_id == profile.player_id
+
+
+def test_non_members_get_no_tenure():
+    players = [(username, *responses(username)) for username in ["Small Fry", "Maxed Max"]]
+    members = MembershipIndex.from_group(fixtures.group(3))
+
+    # Nobody in this index, so neither has a join date
+    expected = profile_results(players, MembershipIndex())
+    results = ClanArrays.from_responses(players, MembershipIndex(), AS_OF).results()
+
+    assert [result.scores.points for result in results] == [result.scores.points for result in expected]
+    assert ClanArrays.from_responses(players, members, AS_OF).totals().tolist() != [result.clan_points for result in results]
+
+
+def test_missing_payloads_keep_their_place():
+    rp_response, wom_response = responses("Typical Tim")
+    results = score_players([
+        ("Typical Tim", rp_response, wom_response),
+        ("Gone", None, wom_response),
+        ("Typical Tim", rp_response, wom_response),
+    ], as_of=AS_OF)
+
+    assert results[1] is None
+    assert results[0].scores.points == results[2].scores.points
+
+
+def test_a_malformed_payload_only_skips_that_player():
+    rp_response, wom_response = responses("Typical Tim")
+    expected = score_players([("Typical Tim", rp_response, wom_response)], as_of=AS_OF)[0]
+    no_snapshot = CachedResponse.from_body(dumps(wom_response.data | {"latestSnapshot": None}))
+    results = score_players([
+        ("Typical Tim", rp_response, wom_response),
+        ("No Snapshot", rp_response, no_snapshot),
+        ("Typical Tim", rp_response, wom_response),
+    ], as_of=AS_OF)
+
+    assert results[1] is None
+    assert results[0].scores.points == results[2].scores.points == expected.scores.points
+    assert results[0].scores.possible_points == expected.scores.possible_points
@@ -0,0 +1,353 @@
+# Scores a whole clan (or a year of snapshots) at once over NumPy arrays.
+# Every criterion becomes a column and each rule type is applied to all of
+# its columns in one go. Loading reads the projected payloads straight into
+# those columns, without building a Profile (or an ItemIndex, saved state
+# and score cache entry) per player, so the only per-player Python left is
+# one pass over each payload's lists. Needs numpy, which is an optional
+# dependency.
+#
+# Scores come out the same as Profile.set_item_data, but nothing is
+# incremental: there's no per-criterion change log and no stored scores.
+import logging
+from datetime import datetime, UTC
+from itertools import repeat
+from operator import itemgetter
+
+import numpy as np
+
+from cache import CachedResponse
+from clan_rank import (
+    CRITERIA, MAX_MINIQUESTS, MAX_QUEST_POINTS, QUEST_COMPLETED, QUEST_TABLE,
+    DiaryEnum, Quest, RankResult, ScoreVector, cache, ladder, quest_key, report_unknown_quest,
+)
+from members import MembershipIndex
+from metrics import metrics
+
+logger = logging.getLogger('ClanRank')
+
+NUMERIC_STATS = sorted({
+    criterion.stat
+    for criterion in CRITERIA
+    if criterion.rule in ("threshold", "capped")
+})
+TIER_STATS = sorted({criterion.stat for criterion in CRITERIA if criterion.rule == "tier"})
+
+
+def columns(*rules: str) -> np.ndarray:
+    return np.array([index for index, criterion in enumerate(CRITERIA) if criterion.rule in rules], dtype=np.intp)
+
+
+THRESHOLD_COLUMNS = columns("threshold")
+THRESHOLD_VALUES = np.array([CRITERIA[index].value for index in THRESHOLD_COLUMNS])
+CAPPED_COLUMNS = columns("capped")
+TIER_COLUMNS = columns("tier")
+FLAG_COLUMNS = columns("quest", "item")
+
+
+def quest_columns() -> dict[str, list[int]]:
+    # Quest key -> the quest criteria it completes, as tagged on each Quest.
+    # Aliases share their quest's entry, so keying by quest.key dedupes them.
+    positions = {criterion.key: index for index, criterion in enumerate(CRITERIA)}
+
+    return {
+        quest.key: [positions[key] for key in quest.criteria]
+        for quest in QUEST_TABLE.values()
+        if quest.criteria
+    }
+
+
+QUEST_COLUMNS = quest_columns()
+ITEM_COLUMNS = [
+    (index, criterion.items, criterion.item_ids)
+    for index, criterion in enumerate(CRITERIA)
+    if criterion.rule == "item"
+]
+# Possible points that are the same for everyone, 0 where it depends on the payload
+FIXED_POSSIBLE = np.array([criterion.points or 0 for criterion in CRITERIA], dtype=np.int64)
+VARIABLE_POSSIBLE = [
+    (index, criterion.stat)
+    for index, criterion in enumerate(CRITERIA)
+    if criterion.points is None
+]
+
+
+def find_quest(name: str) -> Quest | None:
+    # quest_key is cached, payloads repeat the same few hundred names
+    return QUEST_TABLE.get(quest_key(name))
+
+
+def default_now() -> datetime:
+    # Same "now" as Profile.now, so tenure lands on the same day
+    return datetime.today().replace(tzinfo=UTC)
+
+
+def read_row(rp_data: dict, wom_data: dict, join_date: datetime | None, now: datetime) -> tuple[dict, dict, list[int], dict]:
+    # One player's (stats, tiers, criteria whose flag is set, variable
+    # maximums). Nothing is written to the arrays until this has read the
+    # whole payload, so a malformed one leaves its row untouched.
+
+    # Quests, the same one pass as Profile.get_quest_stats
+    states = {}
+    quest_points = 0
+    miniquests = 0
+
+    for entry in rp_data['quests']:
+        quest = find_quest(entry['name'])
+
+        if quest is None:
+            report_unknown_quest(entry['name'])
+            continue
+
+        states[quest.key] = entry['state']
+
+        if entry['state'] == QUEST_COMPLETED:
+            quest_points += quest.points
+            miniquests += quest.miniquest
+
+    flags = [
+        index
+        for key, indices in QUEST_COLUMNS.items()
+        if states.get(key) == QUEST_COMPLETED
+        for index in indices
+    ]
+
+    # Diaries: a tier is done when every area's tasks in it are
+    diary_tasks = 0
+    diary_max = 0
+    unfinished = set()
+
+    for tier in rp_data['achievementDiaryTiers']:
+        diary_tasks += tier['completedCount']
+        diary_max += tier['tasksCount']
+
+        if tier['completedCount'] != tier['tasksCount']:
+            unfinished.add(tier['tierIndex'])
+
+    # Combat achievements: a tier is done once there are enough
+    # points for it and everything below it
+    combat_achievement_points = 0
+    combat_achievement_max = 0
+    cutoffs = []
+
+    for tier in rp_data['combatAchievementTiers']:
+        combat_achievement_points += tier['completedCount'] * tier['id']
+        combat_achievement_max += tier['tasksCount'] * tier['id']
+        cutoffs.append(combat_achievement_max)
+
+    items = rp_data['items']
+    names = set(map(itemgetter('name'), items))
+    # None for items without an id, which no criterion asks for
+    ids = set(map(dict.get, items, repeat('id')))
+
+    flags += [
+        index
+        for index, needed_names, needed_ids in ITEM_COLUMNS
+        if needed_names <= names and needed_ids <= ids
+    ]
+
+    stats = {
+        "quest_points": quest_points,
+        "miniquests": miniquests,
+        "diary_tasks": diary_tasks,
+        "combat_achievement_points": combat_achievement_points,
+        "clogs": len(items),
+        "ehb": wom_data['ehb'],
+        "ehp": wom_data['ehp'],
+        "total_level": wom_data['latestSnapshot']['data']['skills']['overall']['level'],
+        "days_in_clan": (now - join_date).days if join_date is not None else 0,
+    }
+    tiers = {
+        "diary_tiers": [tier.value not in unfinished for tier in DiaryEnum],
+        "combat_achievement_tiers": [combat_achievement_points >= cutoff for cutoff in cutoffs],
+    }
+    max_stats = {"diary_tasks": diary_max, "combat_achievement_points": combat_achievement_max}
+
+    return stats, tiers, flags, max_stats
+
+
+class ClanArrays():
+    def __init__(
+        self,
+        usernames: list[str],
+        stats: dict[str, np.ndarray],
+        tiers: dict[str, np.ndarray],
+        flags: np.ndarray,
+        possible_points: np.ndarray,
+        player_ids: list[int | None] | None = None,
+        failed: set[int] | None = None,
+    ) -> None:
+        # stats:  stat -> (players,) numbers
+        # tiers:  stat -> (players, tiers) bools
+        # flags:  (players, criteria) bools for the quest and item rules
+        # possible_points: (players, criteria) ints
+        self.usernames = usernames
+        self.stats = stats
+        self.tiers = tiers
+        self.flags = flags
+        self.possible_points = possible_points
+        self.player_ids = player_ids or [None] * len(usernames)
+        # Rows whose payloads couldn't be read, all zeros and without a result
+        self.failed = failed or set()
+
+    @classmethod
+    def from_payloads(
+        cls,
+        players: list[tuple[str, dict, dict]],
+        join_dates: list[datetime | None] | None = None,
+        as_of: datetime | None = None,
+    ) -> "ClanArrays":
+        # players are (username, projected RuneProfile data, projected WOM
+        # data). A missing join date means no tenure, like a non-member.
+        count = len(players)
+        now = as_of or default_now()
+        join_dates = join_dates or [None] * count
+
+        flags = np.zeros((count, len(CRITERIA)), dtype=bool)
+        stats = {stat: np.zeros(count, dtype=np.float64) for stat in NUMERIC_STATS}
+        tiers = {stat: [] for stat in TIER_STATS}
+        possible_points = np.tile(FIXED_POSSIBLE, (count, 1))
+        max_stats = {"quest_points": MAX_QUEST_POINTS, "miniquests": MAX_MINIQUESTS}
+        failed = set()
+
+        for row, (username, rp_data, wom_data) in enumerate(players):
+            try:
+                row_stats, row_tiers, row_flags, row_max = read_row(rp_data, wom_data, join_dates[row], now)
+            except Exception:
+                # Left at zero and given no result, like the per-player path
+                logger.exception(f"Failed to score {username}")
+                failed.add(row)
+
+                for stat in TIER_STATS:
+                    tiers[stat].append([])
+
+                continue
+
+            flags[row, row_flags] = True
+
+            for stat in NUMERIC_STATS:
+                stats[stat][row] = row_stats[stat]
+
+            for stat in TIER_STATS:
+                tiers[stat].append(row_tiers[stat])
+
+            max_stats |= row_max
+
+            for index, stat in VARIABLE_POSSIBLE:
+                possible_points[row, index] = max_stats[stat]
+
+        return cls(
+            [username for username, _, _ in players],
+            stats,
+            {stat: tier_array(rows) for stat, rows in tiers.items()},
+            flags,
+            possible_points,
+            [wom_data.get('id') for _, _, wom_data in players],
+            failed,
+        )
+
+    @classmethod
+    def from_responses(
+        cls,
+        players: list[tuple[str, CachedResponse, CachedResponse]],
+        members: MembershipIndex | None = None,
+        as_of: datetime | None = None,
+    ) -> "ClanArrays":
+        # Join dates by WOM id where there is one, like Profile.find_join_date
+        payloads = [(username, rp.data, wom.data) for username, rp, wom in players]
+        join_dates = [
+            members.join_date(username, wom_data.get('id')) if members is not None else None
+            for username, _, wom_data in payloads
+        ]
+
+        return cls.from_payloads(payloads, join_dates, as_of)
+
+    def score(self) -> np.ndarray:
+        # (players, criteria) points, matching what Profile.set_item_data gives each player
+        possible = self.possible_points
+        points = np.zeros_like(possible)
+
+        if len(THRESHOLD_COLUMNS):
+            stat = np.stack([self.stats[CRITERIA[index].stat] for index in THRESHOLD_COLUMNS], axis=1)
+            points[:, THRESHOLD_COLUMNS] = np.where(stat >= THRESHOLD_VALUES, possible[:, THRESHOLD_COLUMNS], 0)
+
+        if len(CAPPED_COLUMNS):
+            # int() in the scalar path truncates towards zero
+            stat = np.stack([self.stats[CRITERIA[index].stat] for index in CAPPED_COLUMNS], axis=1)
+            points[:, CAPPED_COLUMNS] = np.minimum(np.trunc(stat).astype(np.int64), possible[:, CAPPED_COLUMNS])
+
+        if len(TIER_COLUMNS):
+            done = np.stack([self.tiers[CRITERIA[index].stat][:, CRITERIA[index].tier] for index in TIER_COLUMNS], axis=1)
+            points[:, TIER_COLUMNS] = np.where(done, possible[:, TIER_COLUMNS], 0)
+
+        if len(FLAG_COLUMNS):
+            points[:, FLAG_COLUMNS] = np.where(self.flags[:, FLAG_COLUMNS], possible[:, FLAG_COLUMNS], 0)
+
+        # manual rules stay at 0
+        return points
+
+    def totals(self, points: np.ndarray | None = None) -> np.ndarray:
+        return (self.score() if points is None else points).sum(axis=1)
+
+    def ranks(self, totals: np.ndarray | None = None) -> list[str]:
+        totals = self.totals() if totals is None else totals
+        positions = np.maximum(np.searchsorted(ladder.thresholds, totals, side='right') - 1, 0)
+        return [ladder.names[index] for index in positions]
+
+    def results(self, points: np.ndarray | None = None) -> list[RankResult | None]:
+        # One RankResult per player, in the order they were loaded, None for failed rows
+        points = self.score() if points is None else points
+        totals = points.sum(axis=1).tolist()
+        rows = points.tolist()
+        possible = self.possible_points.tolist()
+
+        return [
+            RankResult(
+                username,
+                total,
+                *ladder.standing(total),
+                ScoreVector(possible[row], rows[row]),
+                player_id=self.player_ids[row],
+            )
+            if row not in self.failed else None
+            for row, (username, total) in enumerate(zip(self.usernames, totals))
+        ]
+
+
+def tier_array(rows: list[list[bool]]) -> np.ndarray:
+    # Players with fewer tiers than the rest are padded with not done
+    width = max((len(row) for row in rows), default=0)
+    array = np.zeros((len(rows), width), dtype=bool)
+
+    for position, row in enumerate(rows):
+        array[position, :len(row)] = row
+
+    return array
+
+
+def score_players(
+    players: list[tuple[str, CachedResponse | None, CachedResponse | None]],
+    members: MembershipIndex | None = None,
+    as_of: datetime | None = None,
+) -> list[RankResult | None]:
+    # Results in the same order as players, None for anyone missing a
+    # payload or whose payload couldn't be scored
+    loaded = [(username, rp, wom) for username, rp, wom in players if rp is not None and wom is not None]
+
+    with metrics.timer("vector_load_seconds"):
+        arrays = ClanArrays.from_responses(loaded, members, as_of)
+
+    with metrics.timer("vector_score_seconds"):
+        scored = iter(arrays.results())
+
+    return [next(scored) if rp is not None and wom is not None else None for _, rp, wom in players]
+
+
+def rescore(usernames: list[str], members: MembershipIndex) -> list[RankResult | None]:
+    # batch.rescore over arrays: everyone from the cache, nothing fetched
+    players = [(username, cache.load("runeprofile", username), cache.load("wom", username)) for username in usernames]
+
+    for username, rp, wom in players:
+        if rp is None or wom is None:
+            logger.warning(f"Skipping {username}: no cached RuneProfile and Wise Old Man data")
+
+    return score_players(players, members)